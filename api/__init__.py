@@ -1,14 +1,35 @@
 """ this module creates an instance of our application """
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
+try:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    def trust_proxies(wsgi_app, count):
+        """ Takes the client address and scheme from the headers of count proxies """
+        return ProxyFix(wsgi_app, x_for=count, x_proto=count)
+except ImportError:
+    # werkzeug before 0.15
+    from werkzeug.contrib.fixers import ProxyFix
+
+    def trust_proxies(wsgi_app, count):
+        """ Takes the client address and scheme from the headers of count proxies """
+        return ProxyFix(wsgi_app, num_proxies=count)
+
+from api.database import YummySQLAlchemy
+from api.encoding import YummyJSONEncoder
 from config import CONFIGS as configs
 
 app = Flask(__name__)
+app.json_encoder = YummyJSONEncoder
 app.config.from_object(configs.get("development"))
-db = SQLAlchemy(app)
+db = YummySQLAlchemy(app)
 cors = CORS(app)
+# the client address is taken from the headers of the proxies in front of the app
+if app.config["YUMMY_TRUSTED_PROXIES"]:
+    app.wsgi_app = trust_proxies(app.wsgi_app,
+                                 app.config["YUMMY_TRUSTED_PROXIES"])
 BASE_URL = "/yummy/api/v1.0/"
 # imports added here to avoid circular import errors
-from api import models, auth, routes, errors
+from api import models, auth, routes, errors, replicas, instrumentation,\
+    compression
@@ -1,14 +1,18 @@
 """This is the auth module
 It has end points for user authentication """
 from flask import request, jsonify, abort
+from sqlalchemy.exc import IntegrityError
 
-from api import app, models
+from api import app, models, db
 from api.validator import ValidateUser
+from api.cache import search_cache
+from api.decorators import rate_limited
 from api.helpers import Secure, format_email
 from api import BASE_URL
 
 
 @app.route(f"{BASE_URL}auth/register/", methods=["POST"])
+@rate_limited("register")
 def register_user():
     """ Registers a yummy recipes user """
     if not request.get_json():
@@ -22,20 +26,21 @@ def register_user():
     if validation_errors:
         return jsonify({"errors": validation_errors}), 422
 
-    # check if user already exists
-    existing_user = models.User.query.filter_by(
-        email=format_email(request_data["email"])).first()
-    if existing_user:
+    # register the user, the database refuses an email that is already in use
+    user = models.User(
+        format_email(request_data["email"]), request_data["firstname"],
+        request_data["lastname"], request_data["password"])
+    try:
+        user.save_user()
+    except IntegrityError as error:
+        db.session.rollback()
+        if models.violated_constraint(error) not in models.User.EMAIL_INDEXES:
+            raise
         return jsonify({
             "errors":
             [f"Email address \'{request_data['email']}\' already in use"]
         }), 422
-
-    # register the user
-    user = models.User(
-        format_email(request_data["email"]), request_data["firstname"],
-        request_data["lastname"], request_data["password"])
-    user.save_user()
+    search_cache.delete_tag("users")
 
     return jsonify({
         "messages":
@@ -46,6 +51,7 @@ def register_user():
 
 
 @app.route(f"{BASE_URL}auth/login/", methods=["POST"])
+@rate_limited("login")
 def login_user():
     """ The end point is used to login a user """
     auth_details = request.authorization
@@ -0,0 +1,317 @@
+""" The cache module has in memory caches used to avoid repeating expensive work
+LRUCache is a thread safe least recently used cache whose entries expire and can be tagged
+token_cache maps verified authentication tokens to the details of their users
+search_cache keeps serialized search results, in memory or in redis
+response_cache keeps the responses of GET end points, in memory or in redis with RedisCache
+"""
+import math
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+
+from api import app
+
+
+class LRUCache:
+    """ A bounded least recently used cache whose entries expire after a given time
+    Entries can be given tags so that all entries with a tag can be dropped at once
+    """
+
+    def __init__(self, max_size=1024, ttl=300, max_bytes=None):
+        """
+        LRUCache initializer
+        :param max_size: The maximum number of entries kept in the cache
+        :param ttl: The number of seconds an entry lives if no expiry is given when setting it
+        :param max_bytes: The maximum total size of the entries, None for no limit
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._tags = dict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """ Returns the value stored under key or default if it is absent or expired """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at=None, size=0, tags=()):
+        """
+        Stores a value in the cache evicting the least recently used entries if full
+        :param key: The key to store the value under
+        :param value: The value to store
+        :param expires_at: Unix time after which the entry is stale, defaults to now + ttl
+        :param size: The size of the value in bytes, counted against max_bytes
+        :param tags: Tags to drop the entry by using delete_tag
+        """
+        expiry = time.time() + self.ttl
+        if expires_at is not None:
+            expiry = min(expiry, expires_at)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expiry, size, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size or (
+                    self.max_bytes is not None
+                    and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        """ Removes an entry from the cache if present """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def delete_tag(self, tag):
+        """ Removes all entries stored with a given tag """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        """ Removes all entries and resets the hit and miss counters """
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _remove(self, key):
+        """ Removes an entry and forgets its tags """
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            tagged = self._tags.get(tag)
+            if tagged is not None:
+                tagged.discard(key)
+                if not tagged:
+                    del self._tags[tag]
+
+    @property
+    def stats(self):
+        """ Returns the cache size and hit and miss counters """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """ A cache kept in redis so that all workers share it, with the interface of LRUCache
+    Redis evicts and expires the entries, a set per tag holds the keys of its entries
+    """
+
+    # stores an entry and adds it to its tag sets in one atomic step, a tag set only
+    # ever lives longer so that it outlives every entry in it and can still drop them
+    __script = """
+    local ttl = tonumber(ARGV[1])
+    redis.call("SETEX", KEYS[1], ttl, ARGV[2])
+    for index = 2, #KEYS do
+        redis.call("SADD", KEYS[index], KEYS[1])
+        if redis.call("TTL", KEYS[index]) < ttl then
+            redis.call("EXPIRE", KEYS[index], ttl)
+        end
+    end
+    """
+
+    def __init__(self, url, ttl=300, prefix="yummy:cache:"):
+        """
+        RedisCache initializer
+        :param url: The url of the redis server
+        :param ttl: The number of seconds an entry lives if no expiry is given when setting it
+        :param prefix: The prefix of the keys holding the entries and tags
+        """
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "The redis package is required to keep the cache in redis")
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._redis = redis.StrictRedis.from_url(url)
+        self._set = self._redis.register_script(RedisCache.__script)
+
+    def _key(self, key):
+        return f"{self.prefix}entry:{key!r}"
+
+    def _tag(self, tag):
+        return f"{self.prefix}tag:{tag!r}"
+
+    def get(self, key, default=None):
+        """ Returns the value stored under key or default if it is absent or expired """
+        value = self._redis.get(self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        # only this application writes the entries it reads
+        return pickle.loads(value)
+
+    def set(self, key, value, expires_at=None, size=0, tags=()):
+        """ Stores a value in the cache, see LRUCache.set """
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        self._set(
+            keys=[self._key(key)] + [self._tag(tag) for tag in tags],
+            args=[math.ceil(ttl), pickle.dumps(value)])
+
+    def delete(self, key):
+        """ Removes an entry from the cache if present """
+        self._redis.delete(self._key(key))
+
+    def delete_tag(self, tag):
+        """ Removes all entries stored with a given tag """
+        keys = self._redis.smembers(self._tag(tag))
+        self._redis.delete(self._tag(tag), *keys)
+
+    def clear(self):
+        """ Removes all entries and resets the hit and miss counters """
+        for key in self._redis.scan_iter(match=self.prefix + "*"):
+            self._redis.delete(key)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        """ Returns the hit and miss counters of this worker """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class RouteStats:
+    """ Counts the hits and misses of a cache for each end point """
+
+    def __init__(self):
+        self._counts = dict()
+        self._lock = threading.Lock()
+
+    def record(self, route, hit):
+        """ Counts a lookup made for an end point """
+        with self._lock:
+            counts = self._counts.setdefault(route, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def clear(self):
+        """ Forgets all counts """
+        with self._lock:
+            self._counts.clear()
+
+    @property
+    def stats(self):
+        """ Returns the hits, misses and hit ratio of each end point """
+        with self._lock:
+            return {
+                route: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": hits / (hits + misses)
+                }
+                for route, (hits, misses) in self._counts.items()
+            }
+
+
+def create_cache(storage, max_size, ttl, max_bytes=None, prefix="yummy:cache:"):
+    """ Creates the cache kept in the storage named in the configuration, memory or a redis url """
+    if storage.startswith("redis://") or storage.startswith("rediss://"):
+        return RedisCache(storage, ttl, prefix=prefix)
+    return LRUCache(max_size, ttl, max_bytes=max_bytes)
+
+
+token_cache = LRUCache(app.config["YUMMY_TOKEN_CACHE_SIZE"],
+                       app.config["YUMMY_TOKEN_CACHE_TTL"])
+search_cache = create_cache(
+    app.config["YUMMY_SEARCH_CACHE_STORAGE"],
+    app.config["YUMMY_SEARCH_CACHE_SIZE"],
+    app.config["YUMMY_SEARCH_CACHE_TTL"],
+    max_bytes=app.config["YUMMY_SEARCH_CACHE_MAX_BYTES"],
+    prefix="yummy:search:")
+
+
+# entries live for their end point's ttl, this only bounds them
+response_cache = create_cache(
+    app.config["YUMMY_RESPONSE_CACHE_STORAGE"],
+    app.config["YUMMY_RESPONSE_CACHE_SIZE"],
+    max([
+        app.config["YUMMY_RESPONSE_CACHE_TTL"],
+        *app.config["YUMMY_RESPONSE_CACHE_TTLS"].values()
+    ]),
+    max_bytes=app.config["YUMMY_RESPONSE_CACHE_MAX_BYTES"])
+response_cache_routes = RouteStats()
+
+
+def tag_response(*tags):
+    """ Adds tags to the response being cached, for data only known once the view has loaded it """
+    if "response_tags" in g:
+        g.response_tags.extend(tags)
+
+
+def recipe_tags(owner, recipe_ids=()):
+    """ Returns the tags of the cached responses showing the recipes of a user or some of them """
+    return [("recipes", owner)] + [("recipe", recipe_id) for recipe_id in recipe_ids]
+
+
+def category_tags(owner, category_ids=()):
+    """ Returns the tags of the cached responses showing the recipe categories of a user
+    or some of them, recipe listings show the categories of the recipes too
+    """
+    return [("categories", owner), ("recipes", owner)] + [
+        ("category", category_id) for category_id in category_ids
+    ]
+
+
+def forget_user(user_id):
+    """ Drops cached data showing the details of a user after the user changes them """
+    token_cache.delete_tag(user_id)
+    search_cache.delete_tag("users")
+    search_cache.delete_tag(("owner", user_id))
+    response_cache.delete_tag(("user", user_id))
+
+
+def forget_user_content(user_id, tags=()):
+    """
+    Drops cached data showing the recipes or recipe categories of a user after they change
+    :param user_id: The id of the user whose content changed
+    :param tags: The tags of the cached responses showing the changed content
+    """
+    search_cache.delete_tag(("owner", user_id))
+    for tag in tags:
+        response_cache.delete_tag(tag)
@@ -0,0 +1,97 @@
+""" The compression module compresses response bodies larger than YUMMY_COMPRESS_MIN_BYTES
+The encoding is picked from the Accept-Encoding header of the request among gzip and,
+when their packages are installed, brotli and zstd
+Compressed bodies of responses with an ETag are cached so that an unchanged response is compressed once
+"""
+import gzip
+
+from flask import request
+
+from api import app
+from api.cache import LRUCache
+
+# the media types worth compressing, images and other binary data are already compressed
+COMPRESSIBLE_TYPES = {
+    "application/json", "text/html", "text/plain", "text/css",
+    "application/javascript"
+}
+
+
+def load_encoders():
+    """ Returns functions compressing a body with each available encoding, the preferred first """
+    encoders = dict()
+    try:
+        import brotli
+        encoders["br"] = lambda body: brotli.compress(
+            body, quality=app.config["YUMMY_BROTLI_QUALITY"])
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        encoders["zstd"] = lambda body: zstandard.ZstdCompressor(
+            level=app.config["YUMMY_ZSTD_LEVEL"]).compress(body)
+    except ImportError:
+        pass
+    # mtime is fixed so that the same body always compresses to the same bytes
+    encoders["gzip"] = lambda body: gzip.compress(
+        body, compresslevel=app.config["YUMMY_GZIP_LEVEL"], mtime=0)
+    return encoders
+
+
+encoders = load_encoders()
+
+compressed_bodies = LRUCache(
+    app.config["YUMMY_COMPRESS_CACHE_SIZE"],
+    app.config["YUMMY_COMPRESS_CACHE_TTL"],
+    max_bytes=app.config["YUMMY_COMPRESS_CACHE_MAX_BYTES"])
+
+
+def compress(body, encoding, etag):
+    """
+    Compresses a body reusing the compressed body of a response with the same url and etag
+    :param body: The bytes to compress
+    :param encoding: The name of the encoding to use
+    :param etag: The etag of the response or None
+    :return: The compressed body
+    """
+    key = (request.url, etag, encoding) if etag else None
+    compressed = compressed_bodies.get(key) if key else None
+    if compressed is None:
+        compressed = encoders[encoding](body)
+        if key:
+            compressed_bodies.set(key, compressed, size=len(compressed))
+    return compressed
+
+
+@app.after_request
+def compress_response(response):
+    """ Compresses the body of a response if the client accepts an available encoding """
+    etag, weak = response.get_etag()
+    if response.status_code == 304:
+        # a 304 carries the etag the client has, weak if that of a compressed response
+        if etag and not weak and request.if_none_match.is_weak(etag):
+            response.set_etag(etag, weak=True)
+        return response
+
+    if (not app.config["YUMMY_COMPRESS"] or response.status_code < 200
+            or response.status_code in (204, 206)
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    # caches must keep a response for each encoding
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < app.config["YUMMY_COMPRESS_MIN_BYTES"]:
+        return response
+    encoding = request.accept_encodings.best_match(list(encoders))
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding, etag))
+    response.headers["Content-Encoding"] = encoding
+    # the compressed body is a different representation, no longer byte for byte the same
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,145 @@
+""" The database module configures the engine from the YUMMY_DB settings
+TimedQueuePool is a connection pool that measures how long checkouts wait for a connection
+YummySQLAlchemy applies the pool, statement timeout and PgBouncer settings when the engine is made
+RoutingSession lets reads go to another engine, see the replicas module
+Columns and indexes only postgres has are left out of the tables made on other databases
+"""
+import threading
+import time
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import DDL, event, exc, orm
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """ A QueuePool keeping count of checkouts, the time they waited and those that timed out
+    The wait of a checkout includes opening a new connection when the pool had none idle
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    @property
+    def stats(self):
+        """ Returns the pool occupancy and checkout wait metrics, times are in seconds """
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": self.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "average_wait":
+                self.total_wait / self.checkouts if self.checkouts else 0.0,
+                "max_wait": self.max_wait
+            }
+
+
+# the info of a column made only on postgres
+POSTGRESQL_ONLY = {"postgresql_only": True}
+
+
+@compiles(CreateColumn)
+def create_column(element, compiler, **kw):
+    """ Leaves the columns marked POSTGRESQL_ONLY out of tables made on other databases """
+    if (element.element.info.get("postgresql_only")
+            and compiler.dialect.name != "postgresql"):
+        return None
+    return compiler.visit_create_column(element, **kw)
+
+
+def postgresql_index(table, name, column, using):
+    """ Makes an index when a table is created on postgres only
+    :param table: The table
+    :param name: The name of the index
+    :param column: The name of the indexed column
+    :param using: The index method, such as gin
+    """
+    event.listen(
+        table, "after_create",
+        DDL(f"CREATE INDEX {name} ON {table.name} USING {using} ({column})")
+        .execute_if(dialect="postgresql"))
+
+
+class RoutingSession(SignallingSession):
+    """ A session reading from the engine given by the read_bind function of its extension
+    Flushes and reads while read_bind gives None go to the primary database
+    """
+
+    def __init__(self, db, **options):
+        self.extension = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing:
+            engine = self.extension.read_bind()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class YummySQLAlchemy(SQLAlchemy):
+    """ Flask-SQLAlchemy extension creating postgres engines with the YUMMY_DB settings """
+
+    def __init__(self, *args, **kwargs):
+        # replaced by the replicas module, reads go to the primary until then
+        self.read_bind = lambda: None
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        if not sa_url.drivername.startswith("postgresql"):
+            return sa_url, options
+
+        config = app.config
+        connect_args = options.setdefault("connect_args", dict())
+        connect_args["application_name"] = config["YUMMY_DB_APPLICATION_NAME"]
+        if config["YUMMY_DB_PGBOUNCER"]:
+            # PgBouncer pools the connections and may hand each transaction a different one
+            # so nothing is kept open here and no setting is made for the whole connection
+            options["poolclass"] = NullPool
+            return sa_url, options
+
+        options.update({
+            "poolclass": TimedQueuePool,
+            "pool_size": config["YUMMY_DB_POOL_SIZE"],
+            "max_overflow": config["YUMMY_DB_MAX_OVERFLOW"],
+            "pool_timeout": config["YUMMY_DB_POOL_TIMEOUT"],
+            "pool_recycle": config["YUMMY_DB_POOL_RECYCLE"],
+            "pool_pre_ping": config["YUMMY_DB_PRE_PING"]
+        })
+        connect_args[
+            "options"] = f"-c statement_timeout={config['YUMMY_DB_STATEMENT_TIMEOUT']}"
+        return sa_url, options
+
+
+def pool_stats(engine):
+    """ Returns the metrics of the pool of an engine or None if it does not keep them """
+    return getattr(engine.pool, "stats", None)
@@ -1,12 +1,19 @@
 """ The decorators module has decorators to help avoid
 code duplication among routes in the application
 """
+import hashlib
+import json
+import time
 from functools import wraps
 
-from flask import request, jsonify
+from flask import g, request, jsonify, make_response
 
-from api.helpers import Secure
+from api import app, db
+
+from api.cache import token_cache, response_cache, response_cache_routes
+from api.helpers import Secure, format_email
 from api.models import User, Recipe, RecipeCategory
+from api.ratelimit import rate_limiter
 
 
 def json_data_required(decorated_func):
@@ -26,6 +33,41 @@ def json_data_required(decorated_func):
     return wrapper
 
 
+def rate_limited(scope):
+    """
+    Limits the attempts a client can make on an end point per email and per ip address
+    It runs before the request body is looked at so it must be the outer most decorator
+    :param scope: The name under which the attempts are counted
+    :return: The decorator
+    """
+
+    def decorator(decorated_func):
+        """ Decorates the function """
+
+        @wraps(decorated_func)
+        def wrapper(*args, **kwargs):
+            """ Wraps the decorated function """
+            limits = {
+                f"{scope}:ip:{request.remote_addr}":
+                app.config["YUMMY_RATELIMIT_PER_IP"]
+            }
+            if request.authorization and request.authorization.username:
+                email = request.authorization.username
+            else:
+                data = request.get_json(silent=True)
+                email = data.get("email") if isinstance(data, dict) else None
+            if email:
+                limits[f"{scope}:email:{format_email(email)}"] = app.config[
+                    "YUMMY_RATELIMIT_PER_EMAIL"]
+
+            rate_limiter.hit(limits)
+            return decorated_func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def auth_token_required(decorated_func):
     """ Protects access certain routes if a valid token is not supplied """
 
@@ -37,12 +79,26 @@ def auth_token_required(decorated_func):
         if not token:
             return jsonify({"errors": ["The access token is required"]}), 401
 
-        # grab user id from the token
-        user_id = Secure.decrypt_auth_token(token)["id"]
-        current_user = User.query.filter_by(id=user_id).first()
-
-        if not current_user:
-            return jsonify({"errors": "User not found"}), 404
+        # reuse the user of a token that has already been verified
+        identity = token_cache.get(token)
+        if identity is not None:
+            g.user_id = identity["id"]
+            current_user = User.from_identity(identity)
+        else:
+            # grab user id from the token, it decides where the user is read from
+            token_data, token_header = Secure.decrypt_auth_token(
+                token, return_header=True)
+            g.user_id = token_data["id"]
+            current_user = User.query.filter_by(id=token_data["id"]).first()
+
+            if not current_user:
+                return jsonify({"errors": "User not found"}), 404
+
+            token_cache.set(
+                token,
+                current_user.identity,
+                token_header.get("exp"),
+                tags=[current_user.id])
 
         # call decorated function passing the current user object as the first argument
         return decorated_func(current_user, *args, **kwargs)
@@ -50,12 +106,131 @@ def auth_token_required(decorated_func):
     return wrapper
 
 
+def admin_required(decorated_func):
+    """ Lets only the users listed in YUMMY_ADMIN_EMAILS use an end point
+    This decorator must be used below the auth_token_required decorator
+    """
+
+    @wraps(decorated_func)
+    def wrapper(*args, **kwargs):
+        """ Wraps the decorated function """
+        # the email is read from the database, a cached user may have had it changed elsewhere
+        email = db.session.query(User.email).filter_by(id=args[0].id).scalar()
+        if not email or format_email(email) not in app.config[
+                "YUMMY_ADMIN_EMAILS"]:
+            return jsonify({
+                "errors": ["Only administrators can access this end point"]
+            }), 403
+        return decorated_func(*args, **kwargs)
+
+    return wrapper
+
+
+def conditional_get(version):
+    """
+    Answers a GET request with 304 Not Modified when the client has the latest response
+    The ETag is made from a version of the data, cheaper to get than the response itself,
+    and the user details included in the response, so nothing else is loaded when it matches
+    This decorator must be used below the auth_token_required decorator
+    :param version: A function of the user and the view arguments returning what changes
+                    whenever the response changes, or None to answer the request as usual
+    :return: The decorator
+    """
+
+    def decorator(decorated_func):
+        """ Decorates the function """
+
+        @wraps(decorated_func)
+        def wrapper(*args, **kwargs):
+            """ Wraps the decorated function """
+            user = args[0]
+            state = version(user, **kwargs)
+            if state is None:
+                return decorated_func(*args, **kwargs)
+
+            etag = hashlib.sha1(
+                json.dumps([state, user.user_details],
+                           default=str).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                # cached_response keys the cached body by the etag it was made for
+                g.response_etag = etag
+                try:
+                    response = make_response(decorated_func(*args, **kwargs))
+                finally:
+                    g.pop("response_etag", None)
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # responses differ from user to user
+            response.vary.add("x-access-token")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cached_response(tags):
+    """
+    Caches the successful responses of a GET end point for each user and url, and for
+    the etag of conditional_get when used below it so that a body made from other data than
+    the etag describes is never sent, whichever worker handled the writes
+    The ttl of an end point is set in YUMMY_RESPONSE_CACHE_TTLS, YUMMY_RESPONSE_CACHE_TTL otherwise
+    Writes drop the cached responses through their tags, see forget_user_content,
+    a response read while a write commits may be kept until its ttl is over
+    This decorator must be used below the auth_token_required decorator
+    :param tags: A function of the user and the view arguments returning the tags of the response,
+                 the view can add more with tag_response
+    :return: The decorator
+    """
+
+    def decorator(decorated_func):
+        """ Decorates the function """
+
+        @wraps(decorated_func)
+        def wrapper(*args, **kwargs):
+            """ Wraps the decorated function """
+            if not app.config["YUMMY_RESPONSE_CACHE"]:
+                return decorated_func(*args, **kwargs)
+
+            user = args[0]
+            key = (user.id, request.url, g.get("response_etag"))
+            cached = response_cache.get(key)
+            response_cache_routes.record(request.endpoint, cached is not None)
+            if cached is not None:
+                body, mimetype = cached
+                return app.response_class(body, mimetype=mimetype)
+
+            g.response_tags = [("user", user.id)] + list(tags(user, **kwargs))
+            try:
+                response = make_response(decorated_func(*args, **kwargs))
+                response_tags = g.response_tags
+            finally:
+                g.pop("response_tags", None)
+            if response.status_code == 200 and not response.is_streamed:
+                ttl = app.config["YUMMY_RESPONSE_CACHE_TTLS"].get(
+                    request.endpoint, app.config["YUMMY_RESPONSE_CACHE_TTL"])
+                body = response.get_data()
+                response_cache.set(
+                    key, (body, response.mimetype),
+                    expires_at=time.time() + ttl,
+                    size=len(body),
+                    tags=response_tags)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
 def user_must_own_recipe(decorated_func):
     """
         Ensures that a recipe exists and the user must own a recipe before
         he or she changes anything about it
         This decorator must be used below the auth_token_required decorator
-        The decorated function must have two positional arguments in the order user, recipe
+        The decorated function must have three positional arguments in the order user, recipe, recipe_id
     """
 
     @wraps(decorated_func)
@@ -83,7 +258,7 @@ def user_must_own_recipe(decorated_func):
         kwargs.pop("recipe_id")
 
         # call decorated function
-        return decorated_func(user, recipe, *args, **kwargs)
+        return decorated_func(user, recipe, recipe_id, *args[1:], **kwargs)
 
     return wrapper
 
@@ -122,6 +297,7 @@ def user_must_own_recipe_category(decorated_func):
 
         kwargs.pop("category_id")
 
-        return decorated_func(user, recipe_category, *args, **kwargs)
+        return decorated_func(user, recipe_category, recipe_cat_id, *args[1:],
+                              **kwargs)
 
     return wrapper
@@ -0,0 +1,70 @@
+""" The encoding module has the JSON encoder used by jsonify for all responses
+YummyJSONEncoder writes dates and datetimes in ISO-8601 and encodes with orjson when it is installed
+and YUMMY_JSON_ENCODER is fast, falling back to the standard library otherwise
+stream_json sends a list of items as it is encoded instead of building it whole
+"""
+from datetime import date
+
+from flask import current_app, stream_with_context
+from flask.json import JSONEncoder, dumps
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class YummyJSONEncoder(JSONEncoder):
+    """ Encodes responses compactly unless JSONIFY_PRETTYPRINT_REGULAR is set, even in debug mode
+    orjson encodes dates and datetimes itself, the standard library calls default for each of them
+    """
+
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
+
+    def encode(self, o):
+        config = current_app.config
+        pretty = config["JSONIFY_PRETTYPRINT_REGULAR"]
+        if orjson is not None and config["YUMMY_JSON_ENCODER"] == "fast":
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(o, default=self.default,
+                                option=option).decode()
+        if not pretty:
+            self.indent = None
+            self.item_separator, self.key_separator = ",", ":"
+        return super().encode(o)
+
+
+def stream_json(name, items, serialize, **fields):
+    """
+    Returns a response streaming a JSON object with the serialized items listed under name
+    The items are encoded and sent YUMMY_STREAM_BATCH_SIZE at a time
+    :param name: The key of the list of items
+    :param items: An iterator of the items, only read while the response is sent
+    :param serialize: A function returning what to encode for an item
+    :param fields: Other keys and values of the object, sent before the items
+    :return: The response
+    """
+    batch_size = current_app.config["YUMMY_STREAM_BATCH_SIZE"]
+
+    def generate():
+        """ Yields the encoded object a batch of items at a time """
+        head = dumps(fields)[:-1]
+        yield f"{head}{',' if fields else ''}{dumps(name)}:["
+        batch = []
+        for index, item in enumerate(items):
+            batch.append(("," if index else "") + dumps(serialize(item)))
+            if len(batch) == batch_size:
+                yield "".join(batch)
+                batch = []
+        yield "".join(batch) + "]}\n"
+
+    return current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=current_app.config["JSONIFY_MIMETYPE"])
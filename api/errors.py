@@ -1,12 +1,15 @@
 """This is the errors module
 It houses all error handlers of the api """
+import math
 
 from flask import make_response, jsonify
 from itsdangerous import BadSignature
 
 from api import app, models
 from api.validator import ValidationError
+from api.hashing import HashingBusyError
 from api.helpers import TokenError, TokenExpiredError
+from api.ratelimit import RateLimitExceededError
 
 
 # error handlers
@@ -56,6 +59,22 @@ def handle_token_errors(error):
     return make_response(jsonify({"errors": [error.args[0]]}), 401)
 
 
+@app.errorhandler(HashingBusyError)
+def handle_hashing_busy_error(error):
+    """ Handles password hashing requests refused because the hashing pool is full """
+    return make_response(jsonify({"errors": [error.args[0]]}), 503, {
+        "Retry-After": str(app.config["YUMMY_HASH_RETRY_AFTER"])
+    })
+
+
+@app.errorhandler(RateLimitExceededError)
+def handle_rate_limit_exceeded(error):
+    """ Handles requests made after a client has used up its attempts """
+    return make_response(jsonify({"errors": [error.args[0]]}), 429, {
+        "Retry-After": str(math.ceil(error.retry_after))
+    })
+
+
 @app.errorhandler(500)
 def handle_server_error(error):
     """ Handles internal server errors"""
@@ -0,0 +1,109 @@
+""" The hashing module runs password hashing in a pool of worker processes
+The request thread waits for its hash, but hashing does not hold the interpreter lock
+so the other threads of a web worker keep serving requests meanwhile
+PasswordHasher hands hashing jobs to the pool and refuses new jobs when too many are pending
+Each web worker process has its own pool and limit, they are not shared among workers
+"""
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from api import app
+
+
+class HashingBusyError(Exception):
+    """ Raised when too many password hashing jobs are waiting for the pool """
+    pass
+
+
+class PasswordHasher:
+    """ Hashes and verifies passwords in a bounded pool of worker processes """
+
+    def __init__(self, workers=2, max_pending=16, wait=0.5):
+        """
+        PasswordHasher initializer
+        :param workers: The number of worker processes, 0 hashes on the calling thread
+        :param max_pending: The maximum number of jobs running or waiting for a worker,
+                            0 refuses every job
+        :param wait: Seconds to wait for a free slot before refusing a job
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait = wait
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._jobs = 0
+        self._rejected = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    def hash(self, password):
+        """ Returns the pbkdf2:sha256 hash of a password """
+        return self._run(generate_password_hash, password, "pbkdf2:sha256")
+
+    def verify(self, password_hash, password):
+        """ Checks a password against its hash """
+        return self._run(check_password_hash, password_hash, password)
+
+    def reset(self):
+        """ Drops the worker pool, used after forking since the pool belongs to the parent """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _run(self, func, *args):
+        """ Runs a hashing function in the pool once a slot is free """
+        if not self._slots.acquire(timeout=self.wait):
+            with self._stats_lock:
+                self._rejected += 1
+            raise HashingBusyError(
+                "The server is busy. Please try again shortly")
+
+        with self._stats_lock:
+            self._pending += 1
+        start = time.perf_counter()
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._get_pool().submit(func, *args).result()
+        finally:
+            duration = time.perf_counter() - start
+            with self._stats_lock:
+                self._pending -= 1
+                self._jobs += 1
+                self._total_time += duration
+                self._max_time = max(self._max_time, duration)
+            self._slots.release()
+
+    def _get_pool(self):
+        """ Creates the worker pool on first use """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    @property
+    def stats(self):
+        """ Returns the queue depth and hashing latency of the pool """
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "jobs": self._jobs,
+                "rejected": self._rejected,
+                "average_time":
+                self._total_time / self._jobs if self._jobs else 0.0,
+                "max_time": self._max_time
+            }
+
+
+password_hasher = PasswordHasher(app.config["YUMMY_HASH_WORKERS"],
+                                 app.config["YUMMY_HASH_MAX_PENDING"],
+                                 app.config["YUMMY_HASH_WAIT"])
@@ -2,7 +2,10 @@
 Secure class handles encrypting and decrypting of tokens and user ids
 format_data and format-email methods to ensure storage of uniform data"""
 import re
+from datetime import datetime
 
+from flask import abort
+from sqlalchemy import tuple_
 from itsdangerous import URLSafeSerializer,\
                         TimedJSONWebSignatureSerializer as TimedSerializer, SignatureExpired,\
                         base64_decode, base64_encode
@@ -10,6 +13,9 @@ from itsdangerous import URLSafeSerializer,\
 from api import app
 
 
+CURSOR_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
 class TokenExpiredError(SignatureExpired):
     """ An exception raised when a user uses an expired token """
     pass
@@ -27,6 +33,8 @@ class Secure:
     """
     __serializer = URLSafeSerializer(
         app.config["SECRET_KEY"], salt="yagshjuegsbkajhsi")
+    __cursor_serializer = URLSafeSerializer(
+        app.config["SECRET_KEY"], salt="yummycursorsalt")
     __timed_serializer = TimedSerializer(
         app.config["SECRET_KEY"], expires_in=app.config["YUMMY_TOKEN_EXPIRY"])
 
@@ -40,6 +48,22 @@ class Secure:
         """Decrypts public user ids"""
         return Secure.__serializer.loads(encrypted_id)
 
+    @staticmethod
+    def encrypt_cursor(item):
+        """ Generates an opaque cursor pointing just after an item in a listing """
+        return Secure.__cursor_serializer.dumps(
+            [item.created.strftime(CURSOR_DATE_FORMAT), item.id])
+
+    @staticmethod
+    def decrypt_cursor(cursor):
+        """
+        Retrieves the position a cursor points to
+        :param cursor: The cursor to decrypt
+        :return: A (created, id) tuple of the item just before the next page
+        """
+        created, item_id = Secure.__cursor_serializer.loads(cursor)
+        return datetime.strptime(created, CURSOR_DATE_FORMAT), int(item_id)
+
     @staticmethod
     def generate_auth_token(user_id):
         """ Generates an authentication token """
@@ -48,21 +72,26 @@ class Secure:
         })).decode("utf-8")
 
     @staticmethod
-    def decrypt_auth_token(token):
+    def decrypt_auth_token(token, return_header=False):
         """
         Retrieves information in the access token
         :param token: The token to decrypt
+        :param return_header: Whether to also return the token header which has its expiry time
         :return: The dictionary containing the id of the logged in user
         """
         try:
             return Secure.__timed_serializer.loads(
-                base64_decode(token.encode("utf-8")))
+                base64_decode(token.encode("utf-8")),
+                return_header=return_header)
         except SignatureExpired:
             raise TokenExpiredError("The token has expired")
         except:
             raise TokenError("Invalid Token")
 
 
+INGREDIENT_STOP_WORDS = {"and", "or", "of", "the", "a", "an", "with", "to", "for", "in"}
+
+
 def format_data(data):
     """ Formats data for uniformly saving data in the database """
     return " ".join(str(data).strip().title().split())
@@ -71,6 +100,82 @@ def format_email(email):
     """ Formats email to ensure uniform storage of emails in the database """
     return str(email).strip().lower()
 
+def singularize(word):
+    """ Turns a plural ingredient word to its singular form e.g tomatoes to tomato """
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize_ingredients(ingredients):
+    """ Splits free form ingredients into the normalized words kept in the ingredient index """
+    words = re.findall(r"[a-z]+", str(ingredients or "").lower())
+    return {
+        singularize(word)[:100]
+        for word in words
+        if len(word) > 1 and word not in INGREDIENT_STOP_WORDS
+    }
+
+
 def is_invalid_id(the_id):
     """Checks whether a given id is valid"""
     return re.search(r"\D+", the_id)
+
+
+def get_positive_int(args, name, default):
+    """ Gets a whole number of at least 1 from the query string, answering 400 for anything else """
+    value = str(args.get(name, default))
+    if not value.isdecimal() or int(value) < 1:
+        abort(400)
+    return int(value)
+
+
+def get_page_limit(args, name="limit"):
+    """ Gets the number of items per page from the query string capped at MAX_ITEMS_PER_PAGE """
+    return min(
+        get_positive_int(args, name, app.config.get("ITEMS_PER_PAGE")),
+        app.config.get("MAX_ITEMS_PER_PAGE"))
+
+
+def order_after_cursor(query, model, args):
+    """ Orders a query by creation time starting after the cursor in the after query string param """
+    after = args.get("after")
+    if after:
+        query = query.filter(
+            tuple_(model.created, model.id) > tuple_(*Secure.decrypt_cursor(after)))
+    return query.order_by(model.created, model.id)
+
+
+def paginate_by_cursor(query, model, args):
+    """
+    Gets a page of items ordered by creation time using the limit and after query string params
+    Seeks to the cursor position using the (created, id) index so every page costs the same
+    :param query: The query whose items to paginate
+    :param model: The model being queried, it must have created and id columns
+    :param args: The query string arguments
+    :return: A tuple of the items in the page and the cursor of the next page or None
+    """
+    limit = get_page_limit(args)
+    items = order_after_cursor(query, model, args).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], Secure.encrypt_cursor(items[limit - 1])
+    return items, None
+
+
+def wants_stream(args):
+    """ Tells whether the stream query string param asks for all items to be streamed """
+    return str(args.get("stream", "")).lower() == "true"
+
+
+def stream_by_cursor(query, model, args):
+    """
+    Gets all items after the cursor ordered by creation time, fetching them in batches of
+    YUMMY_STREAM_BATCH_SIZE rows from a server side cursor so only a batch is held at a time
+    :return: An iterator of the items
+    """
+    return order_after_cursor(query, model, args).execution_options(
+        stream_results=True).yield_per(app.config["YUMMY_STREAM_BATCH_SIZE"])
@@ -0,0 +1,115 @@
+""" The instrumentation module records the SQL statements run while handling each request
+QueryStats counts the statements, their time and how often each statement was repeated
+The counts are sent in the X-Query-Count and Server-Timing headers when YUMMY_SQL_HEADERS is set,
+slow requests are logged and in strict mode a statement repeated YUMMY_REPEATED_QUERY_THRESHOLD
+times, the mark of a query run per item (N+1), fails the request
+Only statements run in the request thread are recorded, the concurrent search lookups are not
+"""
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api import app
+from api.slowlog import record_if_slow
+
+
+class RepeatedQueryError(Exception):
+    """ Raised in strict mode when a request runs the same statement too many times """
+    pass
+
+
+class QueryStats:
+    """ The statements run while handling a request """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        """ Records a statement that took duration seconds """
+        self.count += 1
+        self.duration += duration
+        self.statements[" ".join(statement.split())] += 1
+
+    def repeated(self, threshold):
+        """ Returns the statements run at least threshold times with their counts """
+        return {
+            statement: count
+            for statement, count in self.statements.items()
+            if count >= threshold
+        }
+
+
+def current_stats():
+    """ Returns the QueryStats of the current request or None outside a request """
+    return g.get("query_stats") if has_request_context() else None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_timer(conn, cursor, statement, parameters, context, executemany):
+    """ Notes when a statement is sent to the database """
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    """ Adds a statement that has run to the stats of the current request
+    and to the slow query log if it was slow
+    """
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+    record_if_slow(cursor, statement, parameters, duration, executemany)
+
+
+@event.listens_for(Engine, "handle_error")
+def forget_failed_statement(context):
+    """ Drops the start time of a statement that failed """
+    if context.connection is None or context.cursor is None:
+        # the connection failed before any statement was sent
+        return
+    started = context.connection.info.get("query_started")
+    if started:
+        started.pop()
+
+
+@app.before_request
+def start_query_stats():
+    """ Starts recording the statements of a request """
+    g.query_stats = QueryStats()
+
+
+@app.after_request
+def report_query_stats(response):
+    """ Adds the statement count and time to the response, logs slow requests
+    and fails requests repeating a statement in strict mode
+    """
+    stats = current_stats()
+    if stats is None:
+        return response
+    config = app.config
+    duration_ms = stats.duration * 1000
+    repeated = stats.repeated(config["YUMMY_REPEATED_QUERY_THRESHOLD"])
+
+    if config["YUMMY_SQL_HEADERS"]:
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={duration_ms:.2f};desc="{stats.count} queries"')
+
+    if (stats.count >= config["YUMMY_SLOW_REQUEST_QUERIES"]
+            or duration_ms >= config["YUMMY_SLOW_REQUEST_DB_MS"] or repeated):
+        app.logger.warning(
+            "%s %s ran %d queries in %.2f ms, repeated statements: %s",
+            request.method, request.path, stats.count, duration_ms, repeated)
+
+    if repeated and config["YUMMY_REPEATED_QUERY_STRICT"]:
+        raise RepeatedQueryError(
+            f"{request.method} {request.path} repeated statements: {repeated}")
+    return response
@@ -6,11 +6,15 @@ from datetime import datetime
 
 # third party modules
 from flask import url_for
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import Computed, and_, case, exists, func, or_
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 
 # application specific modules
-from api.helpers import Secure, format_data
+from api.hashing import password_hasher
+from api.helpers import Secure, format_data, tokenize_ingredients
 from api import db
+from api.database import POSTGRESQL_ONLY, postgresql_index
 
 
 class UserNotFoundError(Exception):
@@ -18,9 +22,22 @@ class UserNotFoundError(Exception):
     pass
 
 
+def violated_constraint(error):
+    """
+    Finds the unique constraint or index a write broke
+    :param error: An IntegrityError raised by the database
+    :return: The name of the constraint or None if the driver does not tell
+    """
+    return getattr(getattr(error.orig, "diag", None), "constraint_name", None)
+
+
 class User(db.Model):
     """ Contains information about the user  """
     __tablename__ = "users"
+    # the unique indexes a registration or email change with a taken email violates
+    EMAIL_INDEXES = ("users_email_key", "uq_users_lower_email")
+    # the columns kept out of the token cache, loaded when first used
+    UNCACHED = ("password", )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
@@ -28,7 +45,21 @@ class User(db.Model):
     firstname = db.Column(db.String(20), nullable=False)
     lastname = db.Column(db.String(20), nullable=False)
     password = db.Column(db.String(128), nullable=False)
-    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow())
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # used by the full text search backend on postgres, it is not mapped so that it is never loaded
+    search_vector = db.Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple'::regconfig, firstname || ' ' || "
+            "lastname || ' ' || email)",
+            persisted=True),
+        info=POSTGRESQL_ONLY)
+
+    __table_args__ = (
+        db.Index("ix_users_created_id", "created", "id"),
+        # emails are stored lower cased, this keeps out any that differ only by case
+        db.Index("uq_users_lower_email", func.lower(email), unique=True), )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
 
     recipes = db.relationship("Recipe", backref="creator", lazy="dynamic")
     recipe_categories = db.relationship(
@@ -44,8 +75,7 @@ class User(db.Model):
 
     def set_password(self, password):
         """ Sets user password to a new password"""
-        self.password = generate_password_hash(
-            password, method="pbkdf2:sha256")
+        self.password = password_hasher.hash(password)
 
     def verify_password(self, password):
         """
@@ -53,7 +83,31 @@ class User(db.Model):
         :param password: Password user has provided
         :return: True if password is correct false otherwise
         """
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+
+    @property
+    def identity(self):
+        """ Returns the column values of the user, used to cache the user
+        The password is left out so that it is always read from the database
+        """
+        return {
+            column.key: getattr(self, column.key)
+            for column in User.__mapper__.column_attrs
+            if not column.deferred and column.key not in User.UNCACHED
+        }
+
+    @staticmethod
+    def from_identity(identity):
+        """
+        Rebuilds a user from cached column values without querying the database
+        :param identity: The column values returned by User.identity
+        :return: A user object attached to the current session
+        """
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in identity.items():
+            setattr(user, key, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
 
     def save_user(self):
         """ saves the current user to the database"""
@@ -85,16 +139,23 @@ class User(db.Model):
         return f"<User {self.id} {self.firstname} {self.lastname}>"
 
 
+postgresql_index(User.__table__, "ix_users_search_vector",
+                 "search_vector", "gin")
+
+
 class Recipe(db.Model):
     """ Contains information about a recipe """
     __tablename__ = "recipes"
+    NAME_INDEX = "uq_recipes_owner_category_id_name"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     steps = db.Column(db.String(1000))
     ingredients = db.Column(db.String(500))
     category_id = db.Column(
-        db.Integer, db.ForeignKey("recipe_categories.id"), nullable=False)
+        db.Integer,
+        db.ForeignKey("recipe_categories.id", ondelete="CASCADE"),
+        nullable=False)
     image = db.Column(db.String(200))
     privacy = db.Column(db.Integer, default=1)
     favourite = db.Column(db.Integer, default=0)
@@ -106,6 +167,28 @@ class Recipe(db.Model):
         default=db.func.current_timestamp(),
         onupdate=db.func.current_timestamp())
     owner = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # used by the full text search backend on postgres, names rank above ingredients and steps
+    # it is not mapped so that it is never loaded
+    search_vector = db.Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english'::regconfig, name), 'A') || "
+            "setweight(to_tsvector('english'::regconfig, "
+            "coalesce(ingredients, '')), 'B') || "
+            "setweight(to_tsvector('english'::regconfig, "
+            "coalesce(steps, '')), 'C')",
+            persisted=True),
+        info=POSTGRESQL_ONLY)
+
+    # used by the paginated listings of a user's recipes and of recipes in a category
+    # a user cannot have two recipes with the same name in a category
+    __table_args__ = (
+        db.Index("ix_recipes_owner_created_id", "owner", "created", "id"),
+        db.Index("ix_recipes_category_id_created_id", "category_id", "created",
+                 "id"),
+        db.Index(
+            NAME_INDEX, "owner", "category_id", "name", unique=True), )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
 
     def __init__(self, name, steps, ingredients, category_id, owner_id):
         """ Recipe object initializer """
@@ -133,10 +216,145 @@ class Recipe(db.Model):
             "url": url_for("get_recipe", recipe_id=self.id, _external=True)
         }
 
+    @staticmethod
+    def details_loader():
+        """ Loader option that fetches the category and owner read by recipe_details
+        in the same query as the recipes
+        """
+        return joinedload(Recipe.recipe_category).joinedload(
+            RecipeCategory.creator)
+
+    @staticmethod
+    def listing_version(owner, category_id=None):
+        """
+        Gets what changes whenever a listing of a user's recipes changes with one aggregate query
+        Any recipe added, edited or deleted, or any of their categories renamed, changes it
+        :param owner: The id of the user whose recipes are listed
+        :param category_id: The id of the category to list the recipes of, all categories if None
+        :return: The number of recipes and the latest edit time of the recipes and of their
+                 categories or None if the user has no such category
+        """
+        query = db.session.query(
+            func.count(Recipe.id), func.max(Recipe.edited),
+            func.max(RecipeCategory.edited))
+        if category_id is None:
+            return tuple(
+                query.select_from(Recipe).join(Recipe.recipe_category).filter(
+                    Recipe.owner == owner).one())
+        # the category is joined to its recipes so that an empty category is still found
+        row = query.select_from(RecipeCategory).outerjoin(
+            RecipeCategory.recipes).filter(
+                RecipeCategory.id == category_id,
+                RecipeCategory.owner == owner).one()
+        return tuple(row) if row[2] is not None else None
+
+    @staticmethod
+    def version(owner, recipe_id):
+        """
+        Gets what changes whenever the details of a recipe change
+        :return: The edit times of the recipe and its category or None if the user has no such recipe
+        """
+        row = db.session.query(Recipe.edited, RecipeCategory.edited).join(
+            Recipe.recipe_category).filter(Recipe.id == recipe_id,
+                                           Recipe.owner == owner).first()
+        return tuple(row) if row else None
+
     def save_recipe(self):
         """ Saves a recipe """
         db.session.add(self)
+        self.index_ingredients(replace=False)
+        db.session.commit()
+
+    @staticmethod
+    def save_recipes(recipes):
+        """
+        Adds many recipes with one multi row insert in a single transaction
+        Recipes named like one the owner already has in the category are skipped
+        :param recipes: Dictionaries with the name, steps, ingredients, category_id and owner of each recipe
+        :return: The id of each added recipe or None for a skipped one, in the order given
+        """
+        recipes_table = Recipe.__table__
+        added = {(category_id, name): recipe_id
+                 for recipe_id, category_id, name in db.session.execute(
+                     insert(recipes_table).values(recipes).
+                     on_conflict_do_nothing(
+                         index_elements=["owner", "category_id", "name"]).
+                     returning(recipes_table.c.id, recipes_table.c.category_id,
+                               recipes_table.c.name))}
+
+        ids = []
+        for recipe in recipes:
+            # a name repeated within the batch is only added the first time
+            ids.append(added.pop((recipe["category_id"], recipe["name"]), None))
+
+        ingredients = [{
+            "recipe_id": recipe_id,
+            "token": token,
+            "owner": recipe["owner"]
+        } for recipe, recipe_id in zip(recipes, ids) if recipe_id is not None
+                       for token in tokenize_ingredients(recipe["ingredients"])]
+        if ingredients:
+            db.session.execute(
+                insert(RecipeIngredient.__table__).values(ingredients))
+        db.session.commit()
+        return ids
+
+    @staticmethod
+    def move_recipes(owner, category_id, picks):
+        """
+        Moves recipes of a user to a category with one UPDATE
+        A recipe is left where it is if its name is used in the category or by a recipe moved before it
+        :param owner: The id of the user whose recipes to move
+        :param category_id: The id of the category to move the recipes to
+        :param picks: A function giving the condition on a recipes table that picks the recipes to move
+        :return: The ids of the moved recipes
+        """
+        recipes_table = Recipe.__table__
+        other = recipes_table.alias("other")
+        name_taken = exists().where(
+            and_(other.c.owner == owner, other.c.name == recipes_table.c.name,
+                 other.c.id != recipes_table.c.id,
+                 or_(other.c.category_id == category_id,
+                     and_(picks(other), other.c.id < recipes_table.c.id))))
+        moved = [
+            recipe_id for recipe_id, in db.session.execute(
+                recipes_table.update().where(
+                    and_(recipes_table.c.owner == owner, picks(recipes_table),
+                         ~name_taken)).values(category_id=category_id).
+                returning(recipes_table.c.id))
+        ]
+        db.session.commit()
+        return moved
+
+    @staticmethod
+    def delete_recipes(owner, ids):
+        """
+        Deletes recipes of a user with one DELETE, their ingredient index rows go with them
+        :param owner: The id of the user whose recipes to delete
+        :param ids: The ids of the recipes to delete
+        :return: (id, name) tuples of the deleted recipes
+        """
+        recipes_table = Recipe.__table__
+        deleted = db.session.execute(recipes_table.delete().where(
+            and_(recipes_table.c.owner == owner,
+                 recipes_table.c.id.in_(ids))).returning(
+                     recipes_table.c.id, recipes_table.c.name)).fetchall()
         db.session.commit()
+        return [tuple(row) for row in deleted]
+
+    def index_ingredients(self, replace=True):
+        """
+        Adds the words of the recipe to the ingredient index
+        :param replace: Whether to first drop the words indexed before, new recipes have none
+        """
+        # flushing gives a new recipe its id
+        db.session.flush()
+        if replace:
+            RecipeIngredient.query.filter_by(recipe_id=self.id).delete()
+        db.session.add_all([
+            RecipeIngredient(token, self.id, self.owner)
+            for token in tokenize_ingredients(self.ingredients)
+        ])
 
     def delete_recipe(self):
         """ Deletes a recipe """
@@ -149,6 +367,7 @@ class Recipe(db.Model):
         self.steps = recipe_data.get("steps", self.steps)
         self.ingredients = recipe_data.get("ingredients", self.ingredients)
         self.category_id = recipe_data.get("category", self.category_id)
+        self.index_ingredients()
         db.session.commit()
 
     def __repr__(self):
@@ -156,9 +375,14 @@ class Recipe(db.Model):
         return f"<Recipe {self.id} {self.name}>"
 
 
+postgresql_index(Recipe.__table__, "ix_recipes_search_vector",
+                 "search_vector", "gin")
+
+
 class RecipeCategory(db.Model):
     """ Has information about a recipe category """
     __tablename__ = "recipe_categories"
+    NAME_INDEX = "uq_recipe_categories_owner_name"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -170,12 +394,27 @@ class RecipeCategory(db.Model):
         nullable=False,
         default=db.func.current_timestamp(),
         onupdate=db.func.current_timestamp())
-
+    # used by the full text search backend on postgres, it is not mapped so that it is never loaded
+    search_vector = db.Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('english'::regconfig, name)", persisted=True),
+        info=POSTGRESQL_ONLY)
+
+    __table_args__ = (
+        db.Index("ix_recipe_categories_owner_created_id", "owner", "created",
+                 "id"),
+        # a user cannot have two recipe categories with the same name
+        db.Index(NAME_INDEX, "owner", "name", unique=True), )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
+
+    # the database deletes the recipes of a deleted category without them being loaded
     recipes = db.relationship(
         "Recipe",
         backref="recipe_category",
         lazy="dynamic",
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan",
+        passive_deletes=True)
 
     def __init__(self, name, owner):
         """ RecipeCategory object initializer """
@@ -192,6 +431,53 @@ class RecipeCategory(db.Model):
         db.session.delete(self)
         db.session.commit()
 
+    def merge_into(self, category_id):
+        """
+        Moves the recipes of the category to another and deletes it if none are left behind
+        :param category_id: The id of the category to merge into
+        :return: The ids of the moved recipes and (id, name) tuples of recipes whose
+                 names are already used in the other category
+        """
+        merged_id = self.id
+        moved = Recipe.move_recipes(
+            self.owner, category_id,
+            lambda recipes: recipes.c.category_id == merged_id)
+        left_behind = db.session.query(Recipe.id, Recipe.name).filter(
+            Recipe.category_id == merged_id).order_by(Recipe.id).all()
+        if not left_behind:
+            self.delete_recipe_cat()
+        return moved, [tuple(row) for row in left_behind]
+
+    @staticmethod
+    def details_loader():
+        """ Loader option that fetches the owner read by recipe_cat_details
+        in the same query as the recipe categories
+        """
+        return joinedload(RecipeCategory.creator)
+
+    @staticmethod
+    def listing_version(owner):
+        """
+        Gets what changes whenever the recipe categories of a user change with one aggregate query
+        :return: The number of categories and their latest edit time
+        """
+        return tuple(
+            db.session.query(
+                func.count(RecipeCategory.id),
+                func.max(RecipeCategory.edited)).filter(
+                    RecipeCategory.owner == owner).one())
+
+    @staticmethod
+    def version(owner, category_id):
+        """
+        Gets what changes whenever the details of a recipe category change
+        :return: The edit time of the category or None if the user has no such category
+        """
+        row = db.session.query(RecipeCategory.edited).filter(
+            RecipeCategory.id == category_id,
+            RecipeCategory.owner == owner).first()
+        return tuple(row) if row else None
+
     @property
     def recipe_cat_details(self):
         """ Returns a dictionary containing details about a recipe category """
@@ -214,3 +500,55 @@ class RecipeCategory(db.Model):
     def __repr__(self):
         """ RecipeCategory object representation """
         return f"<RecipeCategory {self.id} {self.name}>"
+
+
+postgresql_index(RecipeCategory.__table__, "ix_recipe_categories_search_vector",
+                 "search_vector", "gin")
+
+
+class RecipeIngredient(db.Model):
+    """ The ingredient index, maps normalized ingredient words to the recipes using them """
+    __tablename__ = "recipe_ingredients"
+
+    recipe_id = db.Column(
+        db.Integer,
+        db.ForeignKey("recipes.id", ondelete="CASCADE"),
+        primary_key=True)
+    token = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+
+    __table_args__ = (db.Index("ix_recipe_ingredients_owner_token_recipe_id",
+                               "owner", "token", "recipe_id"), )
+
+    def __init__(self, token, recipe_id, owner):
+        """ RecipeIngredient object initializer """
+        self.token = token
+        self.recipe_id = recipe_id
+        self.owner = owner
+
+    @staticmethod
+    def rank_recipes(owner, tokens, limit):
+        """
+        Ranks the recipes of a user by the share of their ingredients found in tokens
+        Only the index entries of recipes sharing a token with tokens are read
+        :param owner: The id of the user whose recipes to rank
+        :param tokens: The normalized ingredient words available
+        :param limit: The maximum number of recipes to return
+        :return: A list of (recipe_id, matched, total) tuples, best coverage first
+        """
+        matched = func.sum(case([(RecipeIngredient.token.in_(tokens), 1)], else_=0))
+        total = func.count(RecipeIngredient.token)
+        candidates = db.session.query(RecipeIngredient.recipe_id).filter(
+            RecipeIngredient.owner == owner,
+            RecipeIngredient.token.in_(tokens))
+        return db.session.query(
+            RecipeIngredient.recipe_id, matched, total).filter(
+                RecipeIngredient.owner == owner,
+                RecipeIngredient.recipe_id.in_(candidates)).group_by(
+                    RecipeIngredient.recipe_id).order_by(
+                        (matched * 1.0 / total).desc(), matched.desc(),
+                        RecipeIngredient.recipe_id).limit(limit).all()
+
+    def __repr__(self):
+        """ RecipeIngredient object representation """
+        return f"<RecipeIngredient {self.recipe_id} {self.token}>"
@@ -0,0 +1,151 @@
+""" The ratelimit module throttles expensive end points like login and registration
+RateLimiter implements a token bucket per key on top of a pluggable store
+MemoryStore keeps buckets in the worker process, RedisStore shares them among workers
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from api import app
+
+
+class RateLimitExceededError(Exception):
+    """ Raised when a client has used up all the attempts it is allowed """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryStore:
+    """ Keeps token buckets in memory, evicting the least recently used keys when full """
+
+    def __init__(self, max_keys=10000):
+        """
+        MemoryStore initializer
+        :param max_keys: The maximum number of buckets kept at a time
+        """
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period, now):
+        """
+        Takes a token from the bucket of key
+        :param key: The key whose bucket to take a token from
+        :param capacity: The maximum number of tokens in a bucket
+        :param period: The number of seconds it takes an empty bucket to refill
+        :param now: The current unix time
+        :return: 0 if a token was taken otherwise seconds until a token is available
+        """
+        rate = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            # idle keys are the least recently used so they are evicted first
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        """ Removes all buckets """
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisStore:
+    """ Keeps token buckets in redis so that limits hold across all workers """
+
+    # refills and takes a token from a bucket in one atomic step
+    __script = """
+    local capacity = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local rate = capacity / period
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+    redis.call("EXPIRE", KEYS[1], math.ceil(period))
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix="yummy:ratelimit:"):
+        """
+        RedisStore initializer
+        :param url: The url of the redis server
+        :param prefix: The prefix of the keys holding the buckets
+        """
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "The redis package is required to keep rate limits in redis")
+        self.prefix = prefix
+        self._redis = redis.StrictRedis.from_url(url)
+        self._consume = self._redis.register_script(RedisStore.__script)
+
+    def consume(self, key, capacity, period, now):
+        """ Takes a token from the bucket of key, see MemoryStore.consume """
+        return float(
+            self._consume(keys=[self.prefix + key], args=[capacity, period, now]))
+
+    def clear(self):
+        """ Removes all buckets """
+        for key in self._redis.scan_iter(match=self.prefix + "*"):
+            self._redis.delete(key)
+
+
+class RateLimiter:
+    """ Checks requests against limits given in the form 'attempts/seconds' """
+
+    def __init__(self, store):
+        """
+        RateLimiter initializer
+        :param store: The store keeping the token buckets
+        """
+        self.store = store
+
+    @staticmethod
+    def parse_limit(limit):
+        """ Converts a limit like '10/60' to a (capacity, period) tuple """
+        capacity, period = str(limit).split("/")
+        return int(capacity), float(period)
+
+    def hit(self, limits):
+        """
+        Takes a token from each of the buckets of the given keys
+        :param limits: A dictionary mapping keys to their limits
+        :raises RateLimitExceededError: If any of the buckets is empty
+        """
+        now = time.time()
+        wait = 0
+        for key, limit in limits.items():
+            capacity, period = RateLimiter.parse_limit(limit)
+            wait = max(wait, self.store.consume(key, capacity, period, now))
+        if wait:
+            raise RateLimitExceededError(
+                "Too many attempts. Please try again later", wait)
+
+
+def create_store(storage):
+    """ Creates the store named in the YUMMY_RATELIMIT_STORAGE configuration """
+    if storage.startswith("redis://") or storage.startswith("rediss://"):
+        return RedisStore(storage)
+    return MemoryStore(app.config["YUMMY_RATELIMIT_MAX_KEYS"])
+
+
+rate_limiter = RateLimiter(create_store(app.config["YUMMY_RATELIMIT_STORAGE"]))
@@ -0,0 +1,151 @@
+""" The replicas module sends the reads of GET requests to read replicas of the database
+Replicas are used in turn and one that cannot be reached is skipped for a while, a replica is
+only checked again once YUMMY_REPLICA_CHECK_INTERVAL seconds have passed since it last answered
+Requests that write, and GET requests of a user who has just written, use the primary
+so that users see their own changes even when the replicas lag behind
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+
+from api import app, db
+from api.cache import create_cache
+from api.database import pool_stats
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class ReplicaRouter:
+    """ Picks the replica to read from, taking them in turn and skipping unreachable ones """
+
+    def __init__(self):
+        self._engines = dict()
+        self._down_until = dict()
+        self._checked_until = dict()
+        self._turn = 0
+        self._lock = threading.Lock()
+
+    def engine_for(self, uri):
+        """ Returns the engine of a replica, made with the same settings as the primary's """
+        with self._lock:
+            if uri not in self._engines:
+                url, options = db.apply_driver_hacks(app, make_url(uri),
+                                                     dict())
+                engine = create_engine(url, **options)
+
+                @event.listens_for(engine, "handle_error")
+                def skip_lost_replica(context):
+                    """ Skips the replica once a statement finds its connection lost """
+                    if context.is_disconnect:
+                        self.mark_down(uri,
+                                       app.config["YUMMY_REPLICA_RETRY_AFTER"])
+
+                self._engines[uri] = engine
+            return self._engines[uri]
+
+    def mark_down(self, uri, retry_after):
+        """ Skips a replica for retry_after seconds """
+        self._down_until[uri] = time.time() + retry_after
+        self._checked_until.pop(uri, None)
+
+    def pick(self, uris, retry_after, check_interval=0):
+        """
+        Returns the engine of the next replica that can be connected to
+        :param uris: The replica database uris
+        :param retry_after: Seconds to skip a replica for once connecting to it fails
+        :param check_interval: Seconds a replica that could be connected to is used without
+        connecting to it again
+        :return: An engine or None if no replica can be reached
+        """
+        with self._lock:
+            start = self._turn
+            self._turn += 1
+        for offset in range(len(uris)):
+            uri = uris[(start + offset) % len(uris)]
+            now = time.time()
+            if self._down_until.get(uri, 0) > now:
+                continue
+            engine = self.engine_for(uri)
+            if self._checked_until.get(uri, 0) > now:
+                return engine
+            try:
+                engine.connect().close()
+            except exc.DBAPIError:
+                self.mark_down(uri, retry_after)
+                continue
+            self._checked_until[uri] = now + check_interval
+            return engine
+        return None
+
+    @property
+    def down(self):
+        """ Returns the uris of the replicas being skipped """
+        now = time.time()
+        return [uri for uri, until in self._down_until.items() if until > now]
+
+    @property
+    def pool_stats(self):
+        """ Returns the pool metrics of each replica connected to, by its uri without the password """
+        with self._lock:
+            return {
+                repr(engine.url): pool_stats(engine)
+                for engine in self._engines.values()
+            }
+
+    def dispose(self):
+        """ Closes the connections to all replicas and forgets their state """
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            self._down_until.clear()
+            self._checked_until.clear()
+
+
+router = ReplicaRouter()
+# users who wrote in the last YUMMY_READ_YOUR_WRITES seconds, in memory each worker only
+# knows of the writes it handled so with more than one worker they must be kept in redis
+recent_writers = create_cache(app.config["YUMMY_READ_YOUR_WRITES_STORAGE"],
+                              app.config["YUMMY_READ_YOUR_WRITES_MAX_USERS"],
+                              app.config["YUMMY_READ_YOUR_WRITES"],
+                              prefix="yummy:writers:")
+
+
+def read_bind():
+    """ Returns the replica engine the current request reads from or None to read from the primary """
+    if not has_request_context() or request.method not in READ_METHODS:
+        return None
+    uris = app.config["YUMMY_REPLICA_URIS"]
+    if not uris:
+        return None
+    if "yummy_replica" not in g:
+        user_id = g.get("user_id")
+        g.yummy_replica = None if user_id is not None and recent_writers.get(
+            user_id) else router.pick(
+                uris, app.config["YUMMY_REPLICA_RETRY_AFTER"],
+                app.config["YUMMY_REPLICA_CHECK_INTERVAL"])
+    return g.yummy_replica
+
+
+db.read_bind = read_bind
+
+
+@app.before_request
+def forget_request_routing():
+    """ Clears the routing of the previous request sharing the application context """
+    g.pop("yummy_replica", None)
+    g.pop("user_id", None)
+
+
+@app.after_request
+def remember_writer(response):
+    """ Reads the data of a user who has written from the primary for a while """
+    if (app.config["YUMMY_REPLICA_URIS"] and request.method not in READ_METHODS
+            and g.get("user_id") is not None and response.status_code < 400):
+        recent_writers.set(
+            g.user_id, True,
+            expires_at=time.time() + app.config["YUMMY_READ_YOUR_WRITES"])
+    return response
@@ -2,13 +2,28 @@
 It contains all end points of the application
 """
 from flask import jsonify, abort, request, redirect
-from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 
 from api import app, models, db
-from api.helpers import Secure, format_data, format_email, is_invalid_id
-from api.validator import ValidateUser, ValidateRecipeCategory as ValidateCat, ValidateRecipe
+from api.cache import token_cache, search_cache, response_cache, response_cache_routes,\
+                      forget_user, forget_user_content, tag_response,\
+                      recipe_tags, category_tags
+from api import search as search_items
+from api.suggestions import suggester
+from api.helpers import Secure, format_data, format_email, is_invalid_id,\
+                        paginate_by_cursor, get_page_limit, get_positive_int,\
+                        tokenize_ingredients,\
+                        wants_stream, stream_by_cursor
+from api.encoding import stream_json
+from api.database import pool_stats
+from api.hashing import password_hasher
+from api.validator import ValidateUser, ValidateRecipeCategory as ValidateCat, ValidateRecipe,\
+                          ValidationError
 from api.decorators import auth_token_required, json_data_required,\
-                            user_must_own_recipe,user_must_own_recipe_category
+                            user_must_own_recipe,user_must_own_recipe_category,\
+                            admin_required, conditional_get, cached_response
+from api.replicas import router
+from api.slowlog import slow_queries
 from api import BASE_URL
 
 
@@ -19,6 +34,40 @@ def home_page():
         "https://app.swaggerhub.com/api/dennisja/yummy_recipes/1.0.0")
 
 
+def duplicate_recipe_error(owner, category_id, name):
+    """ Returns the response to adding or renaming a recipe to a name already used in the category """
+    errors = {
+        "errors": [
+            "A recipe with the same name, by the same user already exists in the same category"
+        ]
+    }
+    existing_recipe = models.Recipe.query.filter_by(
+        owner=owner, category_id=category_id, name=name).first()
+    # the recipe may have been deleted or renamed since the write clashed with it
+    if existing_recipe:
+        errors["existing_recipe"] = existing_recipe.recipe_details
+    return jsonify(errors), 400
+
+
+def get_batch_recipe_ids(request_data):
+    """
+    Gets the recipe ids sent to a batch end point under recipes
+    :return: The ids without repeats and a list of errors, empty if the ids are fine
+    """
+    ids = request_data.get("recipes") if isinstance(request_data,
+                                                    dict) else None
+    if not isinstance(ids, list) or not ids or not all(
+            isinstance(recipe_id, int) and not isinstance(recipe_id, bool)
+            for recipe_id in ids):
+        return None, ["Send the ids of the recipes as a list under recipes"]
+    max_batch_size = app.config["YUMMY_MAX_BATCH_SIZE"]
+    if len(ids) > max_batch_size:
+        return None, [
+            f"At most {max_batch_size} recipes can be changed at a time"
+        ]
+    return list(dict.fromkeys(ids)), []
+
+
 # recipe category end point
 @app.route(f"{BASE_URL}recipe_categories/", methods=["POST"])
 @json_data_required
@@ -32,21 +81,23 @@ def add_recipe_category(user):
     if recipe_errors:
         return jsonify({"errors": recipe_errors}), 400
 
-    # check whether a recipe category name by the same already exists
-    existing_recipe = models.RecipeCategory.query.filter_by(
-        name=format_data(recipe_cat_data.get("cat_name")),
-        owner=user.id).first()
-
-    if existing_recipe:
+    # create the recipe category, the database refuses a name the user already uses
+    recipe = models.RecipeCategory(
+        format_data(recipe_cat_data.get("cat_name")), user.id)
+    try:
+        recipe.save_recipe_cat()
+    except IntegrityError as error:
+        db.session.rollback()
+        if models.violated_constraint(
+                error) != models.RecipeCategory.NAME_INDEX:
+            raise
         return jsonify({
             "errors":
             ["The Recipe Category you are trying to add already exists"]
         }), 400
-
-    # create the recipe category
-    recipe = models.RecipeCategory(
-        format_data(recipe_cat_data.get("cat_name")), user.id)
-    recipe.save_recipe_cat()
+    forget_user_content(user.id,
+                        [("categories", user.id), ("category", recipe.id)])
+    suggester.added(user.id, recipe.name, "category", recipe.id)
 
     return jsonify({
         "message": "Successfully created recipe category",
@@ -67,26 +118,31 @@ def edit_recipe_category(user, recipe_cat, category_id):
     if recipe_cat_errors:
         return jsonify({"errors": recipe_cat_errors}), 400
 
-    existing_recipe_cat = models.RecipeCategory.query.filter_by(
-        name=format_data(recipe_cat_data.get("cat_name")),
-        owner=user.id).first()
-
-    if existing_recipe_cat and existing_recipe_cat.id != category_id:
+    # the current name of the category counts as taken too
+    old_name = recipe_cat.name
+    name_taken = format_data(recipe_cat_data.get("cat_name")) == old_name
+
+    # edit the recipe, the database refuses a name the user already uses
+    if not name_taken:
+        recipe_cat.name = format_data(recipe_cat_data.get("cat_name"))
+        try:
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            if models.violated_constraint(
+                    error) != models.RecipeCategory.NAME_INDEX:
+                raise
+            name_taken = True
+
+    if name_taken:
         return jsonify({
             "errors": [
                 "The new recipe category name you are trying to use already exists"
             ]
         }), 400
-
-    if format_data(recipe_cat_data.get("cat_name")) == recipe_cat.name:
-        return jsonify({
-            "message":
-            "Recipe category name is similar to the previous. No changes where made"
-        }), 400
-
-    # edit the recipe
-    recipe_cat.name = format_data(recipe_cat_data.get("cat_name"))
-    db.session.commit()
+    forget_user_content(user.id, category_tags(user.id, [category_id]))
+    suggester.renamed(user.id, old_name, recipe_cat.name, "category",
+                      recipe_cat.id)
 
     return jsonify({
         "message": "Successfully edited recipe category",
@@ -102,15 +158,72 @@ def delete_recipe_category(user, recipe_cat, category_id):
     """ Deletes a recipe category """
     # delete the recipe category and all its recipes
     recipe_cat.delete_recipe_cat()
+    forget_user_content(user.id, category_tags(user.id, [category_id]))
+    # the category's recipes are gone too so the index is rebuilt on next use
+    suggester.forget(user.id)
     return jsonify({"message": "Recipe Category successfully deleted"}), 200
 
 
+@app.route(
+    f"{BASE_URL}recipe_categories/<int:category_id>/merge", methods=["POST"])
+@json_data_required
+@auth_token_required
+@user_must_own_recipe_category
+def merge_recipe_category(user, recipe_cat, category_id):
+    """ Moves the recipes of a category into another and deletes it if all could be moved """
+    into = str(request.get_json().get("into", ""))
+    target = models.RecipeCategory.query.filter_by(
+        id=int(into)).first() if into.isdecimal() else None
+    if not target or target.owner != user.id:
+        return jsonify({
+            "errors": [
+                "The recipe category you are trying to merge into does not exist"
+            ]
+        }), 404
+    if target.id == category_id:
+        return jsonify({
+            "errors": ["A recipe category cannot be merged into itself"]
+        }), 400
+
+    name = recipe_cat.name
+    moved, conflicts = recipe_cat.merge_into(target.id)
+    forget_user_content(user.id,
+                        category_tags(user.id, [category_id, target.id]))
+    if not conflicts:
+        suggester.removed(user.id, name, "category", category_id)
+
+    return jsonify({
+        "message":
+        "Recipe categories successfully merged" if not conflicts else
+        "Recipes named like recipes in the other category were left behind",
+        "moved": moved,
+        "conflicts": [{
+            "id": recipe_id,
+            "name": recipe_name
+        } for recipe_id, recipe_name in conflicts],
+        "category_deleted": not conflicts
+    }), 200
+
+
 @app.route(f"{BASE_URL}recipe_categories/", methods=["GET"])
 @auth_token_required
+@conditional_get(
+    lambda user: models.RecipeCategory.listing_version(user.id))
+@cached_response(lambda user: [("categories", user.id)])
 def get_all_user_recipe_categories(user):
-    """ Gets all user recipe categories """
-    user_cats = models.RecipeCategory.query.filter_by(owner=user.id).all()
-    if not user_cats:
+    """ Gets all user recipe categories a page at a time or all of them streamed """
+    query = models.RecipeCategory.query.filter_by(owner=user.id).options(
+        models.RecipeCategory.details_loader())
+    if wants_stream(request.args):
+        return stream_json(
+            "recipe_cats",
+            stream_by_cursor(query, models.RecipeCategory, request.args),
+            lambda category: category.recipe_cat_details,
+            message="Recipe Categories exists",
+            next_cursor=None)
+    user_cats, next_cursor = paginate_by_cursor(query, models.RecipeCategory,
+                                                request.args)
+    if not user_cats and "after" not in request.args:
         return jsonify({
             "errors": ["You have not added any recipe categories yet"]
         }), 404
@@ -118,12 +231,16 @@ def get_all_user_recipe_categories(user):
     return jsonify({
         "message":
         "Recipe Categories exists",
-        "recipe_cats": [category.recipe_cat_details for category in user_cats]
+        "recipe_cats": [category.recipe_cat_details for category in user_cats],
+        "next_cursor": next_cursor
     })
 
 
 @app.route(f"{BASE_URL}recipe_categories/<int:category_id>", methods=["GET"])
 @auth_token_required
+@conditional_get(lambda user, category_id: models.RecipeCategory.version(
+    user.id, category_id))
+@cached_response(lambda user, category_id: [("category", category_id)])
 def get_recipe_category(user, category_id):
     """ Gets a recipe categories """
     recipe_cat = user.recipe_categories.filter_by(id=category_id).first()
@@ -143,15 +260,29 @@ def get_recipe_category(user, category_id):
 @app.route(
     f"{BASE_URL}recipe_categories/<int:category_id>/recipes/", methods=["GET"])
 @auth_token_required
+@conditional_get(lambda user, category_id: models.Recipe.listing_version(
+    user.id, category_id))
+@cached_response(lambda user, category_id: [("recipes", user.id),
+                                            ("category", category_id)])
 def get_all_recipes_in_a_category(user, category_id):
-    """ Gets user recipes in a particular category """
+    """ Gets user recipes in a particular category a page at a time or all of them streamed """
     recipe_cat = user.recipe_categories.filter_by(id=category_id).first()
     if not recipe_cat:
         abort(404)
-    recipes = recipe_cat.recipes
+    query = recipe_cat.recipes.options(models.Recipe.details_loader())
+    if wants_stream(request.args):
+        return stream_json(
+            "recipes",
+            stream_by_cursor(query, models.Recipe, request.args),
+            lambda recipe: recipe.recipe_details,
+            message="Category exists",
+            next_cursor=None)
+    recipes, next_cursor = paginate_by_cursor(query, models.Recipe,
+                                              request.args)
     return jsonify({
         "message": "Category exists",
-        "recipes": [recipe.recipe_details for recipe in recipes]
+        "recipes": [recipe.recipe_details for recipe in recipes],
+        "next_cursor": next_cursor
     }), 200
 
 
@@ -183,25 +314,20 @@ def add_recipe(user):
             ]
         }), 403
 
-    # check if a recipe with the same name exists in the same category and by the same user
-    recipe_exists = models.Recipe.query.filter_by(
-        name=format_data(recipe_data.get("name")),
-        owner=user.id,
-        category_id=recipe_data.get("category")).first()
-    if recipe_exists:
-        return jsonify({
-            "errors": [
-                "A recipe with the same name, by the same user already exists in the same category"
-            ],
-            "existing_recipe":
-            recipe_exists.recipe_details
-        }), 400
-
-    # add the recipe
+    # add the recipe, the database refuses a name the user already uses in the category
     recipe = models.Recipe(
         format_data(recipe_data.get("name")), recipe_data.get("steps"),
         recipe_data.get("ingredients"), recipe_data.get("category"), user.id)
-    recipe.save_recipe()
+    try:
+        recipe.save_recipe()
+    except IntegrityError as error:
+        db.session.rollback()
+        if models.violated_constraint(error) != models.Recipe.NAME_INDEX:
+            raise
+        return duplicate_recipe_error(user.id, recipe_cat.id,
+                                      format_data(recipe_data.get("name")))
+    forget_user_content(user.id, recipe_tags(user.id, [recipe.id]))
+    suggester.added(user.id, recipe.name, "recipe", recipe.id)
     return jsonify({
         "message": "Successfully added recipe",
         "recipe": recipe.recipe_details
@@ -210,6 +336,183 @@ def add_recipe(user):
     }
 
 
+@app.route(f"{BASE_URL}recipes/batch", methods=["POST"])
+@json_data_required
+@auth_token_required
+def add_recipes(user):
+    """ Adds many recipes at once, reporting whether each was created, a duplicate or invalid """
+    request_data = request.get_json()
+    recipes_data = request_data.get("recipes") if isinstance(
+        request_data, dict) else None
+    if not isinstance(recipes_data, list) or not recipes_data:
+        return jsonify({
+            "errors": ["Send the recipes to add as a list under recipes"]
+        }), 400
+
+    max_batch_size = app.config["YUMMY_MAX_BATCH_SIZE"]
+    if len(recipes_data) > max_batch_size:
+        return jsonify({
+            "errors":
+            [f"At most {max_batch_size} recipes can be added at a time"]
+        }), 400
+
+    results = [None] * len(recipes_data)
+    valid_recipes = dict()
+    for index, recipe_data in enumerate(recipes_data):
+        if not isinstance(recipe_data, dict):
+            recipe_errors = ["A recipe must be an object"]
+        else:
+            try:
+                recipe_errors = ValidateRecipe.validate_recipe(recipe_data)
+            except ValidationError as error:
+                recipe_errors = [error.args[0]]
+        if recipe_errors:
+            results[index] = {"status": "invalid", "errors": recipe_errors}
+        else:
+            valid_recipes[index] = recipe_data
+
+    # the categories of all the recipes are looked up at once
+    category_ids = {int(data["category"]) for data in valid_recipes.values()}
+    category_owners = dict(
+        db.session.query(models.RecipeCategory.id, models.RecipeCategory.owner)
+        .filter(models.RecipeCategory.id.in_(category_ids))) if category_ids else {}
+
+    new_recipes = dict()
+    for index, recipe_data in valid_recipes.items():
+        owner = category_owners.get(int(recipe_data["category"]))
+        if owner is None:
+            results[index] = {
+                "status": "invalid",
+                "errors":
+                ["Trying to add a recipe to a category that does not exist"]
+            }
+        elif owner != user.id:
+            results[index] = {
+                "status":
+                "invalid",
+                "errors": [
+                    "Trying to add a recipe to a category that does not belong to you"
+                ]
+            }
+        else:
+            new_recipes[index] = {
+                "name": format_data(recipe_data.get("name")),
+                "steps": recipe_data.get("steps"),
+                "ingredients": recipe_data.get("ingredients"),
+                "category_id": int(recipe_data["category"]),
+                "owner": user.id
+            }
+
+    ids = models.Recipe.save_recipes(list(
+        new_recipes.values())) if new_recipes else []
+    created = {
+        recipe.id: recipe
+        for recipe in models.Recipe.query.filter(
+            models.Recipe.id.in_([recipe_id for recipe_id in ids if recipe_id])
+        ).options(models.Recipe.details_loader())
+    } if any(ids) else {}
+
+    for index, recipe_id in zip(new_recipes, ids):
+        if recipe_id is None:
+            results[index] = {
+                "status":
+                "duplicate",
+                "errors": [
+                    "A recipe with the same name, by the same user already exists in the same category"
+                ]
+            }
+        else:
+            results[index] = {
+                "status": "created",
+                "recipe": created[recipe_id].recipe_details
+            }
+            suggester.added(user.id, created[recipe_id].name, "recipe",
+                            recipe_id)
+    if created:
+        forget_user_content(user.id, recipe_tags(user.id, created))
+
+    return jsonify({
+        "message": f"Added {len(created)} of {len(recipes_data)} recipes",
+        "results": results
+    }), 200
+
+
+@app.route(f"{BASE_URL}recipes/batch", methods=["PUT"])
+@json_data_required
+@auth_token_required
+def move_recipes(user):
+    """ Moves many recipes to a category with one statement """
+    request_data = request.get_json()
+    ids, errors = get_batch_recipe_ids(request_data)
+    if errors:
+        return jsonify({"errors": errors}), 400
+
+    category = str(request_data.get("category", ""))
+    recipe_cat = models.RecipeCategory.query.filter_by(
+        id=int(category)).first() if category.isdecimal() else None
+    if not recipe_cat:
+        return jsonify({
+            "errors":
+            ["Trying to move recipes to a category that does not exist"]
+        }), 404
+    if recipe_cat.owner != user.id:
+        return jsonify({
+            "errors": [
+                "Trying to move recipes to a category that does not belong to you"
+            ]
+        }), 403
+
+    moved = models.Recipe.move_recipes(
+        user.id, recipe_cat.id, lambda recipes: recipes.c.id.in_(ids))
+    moved = set(moved)
+    left_behind = [recipe_id for recipe_id in ids if recipe_id not in moved]
+    # the recipes of the user that were not moved have names already used in the category
+    conflicts = db.session.query(models.Recipe.id, models.Recipe.name).filter(
+        models.Recipe.owner == user.id,
+        models.Recipe.id.in_(left_behind)).order_by(
+            models.Recipe.id).all() if left_behind else []
+    conflict_ids = {recipe_id for recipe_id, _ in conflicts}
+    if moved:
+        forget_user_content(user.id, recipe_tags(user.id, moved))
+
+    return jsonify({
+        "message":
+        f"Moved {len(moved)} of {len(ids)} recipes",
+        "moved":
+        sorted(moved),
+        "conflicts": [{
+            "id": recipe_id,
+            "name": name
+        } for recipe_id, name in conflicts],
+        "not_found":
+        [recipe_id for recipe_id in left_behind if recipe_id not in conflict_ids]
+    }), 200
+
+
+@app.route(f"{BASE_URL}recipes/batch", methods=["DELETE"])
+@json_data_required
+@auth_token_required
+def delete_recipes(user):
+    """ Deletes many recipes with one statement """
+    ids, errors = get_batch_recipe_ids(request.get_json())
+    if errors:
+        return jsonify({"errors": errors}), 400
+
+    deleted = models.Recipe.delete_recipes(user.id, ids)
+    for recipe_id, name in deleted:
+        suggester.removed(user.id, name, "recipe", recipe_id)
+    deleted_ids = {recipe_id for recipe_id, _ in deleted}
+    if deleted:
+        forget_user_content(user.id, recipe_tags(user.id, deleted_ids))
+
+    return jsonify({
+        "message": f"Deleted {len(deleted)} of {len(ids)} recipes",
+        "deleted": sorted(deleted_ids),
+        "not_found":
+        [recipe_id for recipe_id in ids if recipe_id not in deleted_ids]
+    }), 200
+
+
 @app.route(f"{BASE_URL}recipes/<int:recipe_id>", methods=["PUT"])
 @json_data_required
 @auth_token_required
@@ -244,24 +547,18 @@ def edit_a_recipe(user, recipe, recipe_id):
                 "Trying to move a recipe to a category that does not belong to you"
             ]
         }), 403
-    ''' check whether the new name does not belong to any other recipe by
-        the same user in the same category '''
-    recipe_exists = models.Recipe.query.filter_by(
-        name=format_data(recipe_data.get("name")),
-        owner=user.id,
-        category_id=recipe_data.get("category")).first()
-
-    if recipe_exists and recipe_exists.id != recipe_id:
-        return jsonify({
-            "errors": [
-                "A recipe with the same name, by the same user already exists in the same category"
-            ],
-            "existing_recipe":
-            recipe_exists.recipe_details
-        }), 400
-
-    # edit the recipe
-    recipe.edit_recipe(recipe_data)
+    # edit the recipe, the database refuses a name the user already uses in the category
+    old_name = recipe.name
+    try:
+        recipe.edit_recipe(recipe_data)
+    except IntegrityError as error:
+        db.session.rollback()
+        if models.violated_constraint(error) != models.Recipe.NAME_INDEX:
+            raise
+        return duplicate_recipe_error(user.id, recipe_cat.id,
+                                      format_data(recipe_data.get("name")))
+    forget_user_content(user.id, recipe_tags(user.id, [recipe_id]))
+    suggester.renamed(user.id, old_name, recipe.name, "recipe", recipe.id)
 
     return jsonify({
         "message": "Successfully edited recipe",
@@ -293,6 +590,7 @@ def publish_recipe(user, recipe, recipe_id):
     recipe.privacy = 0 if action == "publish" else 1
     suffix = "Un " if action == "publish" else ""
     db.session.commit()
+    forget_user_content(user.id, recipe_tags(user.id, [recipe_id]))
     return jsonify({
         "message": f"{suffix}Published recipe",
         "recipe": recipe.recipe_details
@@ -304,24 +602,80 @@ def publish_recipe(user, recipe, recipe_id):
 @user_must_own_recipe
 def delete_recipe(user, recipe, recipe_id):
     """ Deletes a single recipe """
+    name = recipe.name
     recipe.delete_recipe()
+    forget_user_content(user.id, recipe_tags(user.id, [recipe_id]))
+    suggester.removed(user.id, name, "recipe", recipe_id)
     return jsonify({"message": "Successfully deleted a recipe"})
 
 
 @app.route(f"{BASE_URL}recipes/", methods=["GET"])
 @auth_token_required
+@conditional_get(lambda user: models.Recipe.listing_version(user.id))
+@cached_response(lambda user: [("recipes", user.id)])
 def get_all_user_recipes(user):
-    """ Gets user recipes """
+    """ Gets user recipes a page at a time or all of them streamed """
+    query = user.recipes.options(models.Recipe.details_loader())
+    if wants_stream(request.args):
+        return stream_json(
+            "recipes",
+            stream_by_cursor(query, models.Recipe, request.args),
+            lambda recipe: recipe.recipe_details,
+            next_cursor=None)
+    recipes, next_cursor = paginate_by_cursor(query, models.Recipe,
+                                              request.args)
     return jsonify({
-        "recipes": [recipe.recipe_details for recipe in user.recipes]
+        "recipes": [recipe.recipe_details for recipe in recipes],
+        "next_cursor": next_cursor
+    }), 200
+
+
+@app.route(f"{BASE_URL}recipes/cook_with", methods=["GET"])
+@auth_token_required
+def get_recipes_by_ingredients(user):
+    """ Gets the user recipes that can be cooked with the given ingredients
+    ranked by the share of each recipe's ingredients that are available
+    """
+    tokens = tokenize_ingredients(request.args.get("ingredients"))
+    if not tokens:
+        return jsonify({
+            "errors": [
+                "Supply the ingredients you have as a comma separated list and try again"
+            ]
+        }), 400
+
+    ranking = models.RecipeIngredient.rank_recipes(user.id, tokens,
+                                                   get_page_limit(request.args))
+    recipes = {
+        recipe.id: recipe
+        for recipe in models.Recipe.query.filter(
+            models.Recipe.id.in_([recipe_id for recipe_id, _, _ in ranking])).
+        options(models.Recipe.details_loader())
+    } if ranking else {}
+
+    return jsonify({
+        "ingredients": sorted(tokens),
+        "recipes": [
+            dict(
+                recipes[recipe_id].recipe_details,
+                matched_ingredients=int(matched),
+                coverage=round(matched / total, 2))
+            for recipe_id, matched, total in ranking
+        ]
     }), 200
 
 
 @app.route(f"{BASE_URL}recipes/<int:recipe_id>", methods=["GET"])
 @auth_token_required
+@conditional_get(
+    lambda user, recipe_id: models.Recipe.version(user.id, recipe_id))
+@cached_response(lambda user, recipe_id: [("recipe", recipe_id)])
 def get_recipe(user, recipe_id):
     """ Gets a single recipe """
     recipe = user.recipes.filter_by(id=recipe_id).first()
+    # the recipe shows the details of its category
+    if recipe:
+        tag_response(("category", recipe.category_id))
 
     if not recipe:
         return jsonify({
@@ -347,21 +701,22 @@ def edit_user_details(user):
     if edit_errors:
         return jsonify({"errors": edit_errors}), 400
 
-    # check whether email user is changing to is already taken
-    email_in_use = models.User.query.filter_by(
-        email=format_email(user_data["email"])).first()
+    # the database refuses an email that is already taken
+    user.email = format_email(user_data.get("email"))
+    user.firstname = user_data.get("firstname")
+    user.lastname = user_data.get("lastname")
 
-    if email_in_use and email_in_use.id != user.id:
+    try:
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if models.violated_constraint(error) not in models.User.EMAIL_INDEXES:
+            raise
         return jsonify({
             "errors":
             [f"The email \'{user_data['email']}\' is already in use"]
         }), 400
-
-    user.email = format_email(user_data.get("email"))
-    user.firstname = user_data.get("firstname")
-    user.lastname = user_data.get("lastname")
-
-    db.session.commit()
+    forget_user(user.id)
     return jsonify({
         "message": "All changes where applied successfully",
         "new_user_details": user.user_details
@@ -388,6 +743,7 @@ def change_user_password(user):
 
     user.set_password(request.get_json().get("new_password"))
     db.session.commit()
+    token_cache.delete_tag(user.id)
 
     # change the password if no error has occurred
     return jsonify({"message": "Password Changed Successfully"}), 200
@@ -396,18 +752,27 @@ def change_user_password(user):
 @app.route(f"{BASE_URL}users/", methods=["GET"])
 @auth_token_required
 def get_all_registered_users(user):
-    """ Gets all the registered users """
-    users = models.User.query.all()
-    if not users:
+    """ Gets all the registered users a page at a time or all of them streamed """
+    if wants_stream(request.args):
+        return stream_json(
+            "users",
+            stream_by_cursor(models.User.query, models.User, request.args),
+            lambda current_user: current_user.user_details,
+            next_cursor=None)
+    users, next_cursor = paginate_by_cursor(models.User.query, models.User,
+                                            request.args)
+    if not users and "after" not in request.args:
         return jsonify({"errors": ["No user found"]}), 404
 
     return jsonify({
-        "users": [current_user.user_details for current_user in users]
+        "users": [current_user.user_details for current_user in users],
+        "next_cursor": next_cursor
     }), 200
 
 
 @app.route(f"{BASE_URL}users/<id>/", methods=["GET"])
 @auth_token_required
+@cached_response(lambda user, id: [])
 def get_user(user, id):
     """ Gets user details """
     user_id = id
@@ -415,6 +780,7 @@ def get_user(user, id):
         abort(400)
     if user_id:
         user = models.User.query.filter_by(id=user_id).first_or_404()
+        tag_response(("user", user.id))
         return jsonify({"data": user.user_details})
 
 
@@ -442,43 +808,30 @@ def search(user):
     if not search_terms:
         return jsonify({"errors": ["Search term is empty"]}), 400
 
-    user_conditions = [
-        models.User.firstname.like(f"%{term}%") for term in search_terms
-    ] + [models.User.lastname.like(f"%{term}%") for term in search_terms
-         ] + [models.User.email.like(f"%{term}%") for term in search_terms]
-    recipe_conditions = [
-        models.Recipe.name.like(f"%{term}%") for term in search_terms
-    ] + [models.Recipe.steps.like(f"%{term}%") for term in search_terms] + [
-        models.Recipe.ingredients.like(f"%{term}%") for term in search_terms
-    ]
-    category_conditions = [
-        models.RecipeCategory.name.like(f"%{term}%") for term in search_terms
-    ]
-
-    page = int(request.args.get("page", 1))
-    per_page = int(
-        request.args.get("per_page", app.config.get("ITEMS_PER_PAGE")))
-    max_per_page = app.config.get("MAX_ITEMS_PER_PAGE")
-    if per_page > max_per_page:
-        per_page = max_per_page
-
-    users = models.User.query.filter(or_(*user_conditions)).paginate(
-        page, per_page, False)
-    recipes = models.Recipe.query.filter(
-        or_(*recipe_conditions)).filter_by(owner=user.id).paginate(
-            page, per_page, False)
-    categories = models.RecipeCategory.query.filter(
-        or_(*category_conditions)).filter_by(owner=user.id).paginate(
-            page, per_page, False)
-            
-    total_pages = max([users.pages, recipes.pages, categories.pages])
+    page = get_positive_int(request.args, "page", 1)
+    per_page = get_page_limit(request.args, "per_page")
+
+    count_mode = request.args.get("count", "exact")
+    if count_mode not in search_items.COUNT_MODES:
+        return jsonify({
+            "errors": ["The count option can either be exact, estimate or none"]
+        }), 400
+
+    results = search_items.search(user.id, search_terms, page, per_page,
+                                  count_mode)
+    users, recipes, categories = results["users"], results["recipes"],\
+        results["categories"]
+
+    totals = [users.total, recipes.total, categories.total]
+    counted = count_mode != "none"
+    total_pages = max(
+        search_items.count_pages(total, per_page)
+        for total in totals) if counted else None
 
     response_body = {
-        "users": [each_user.user_details for each_user in users.items],
-        "recipes":
-        [each_recipe.recipe_details for each_recipe in recipes.items],
-        "categories":
-        [each_cat.recipe_cat_details for each_cat in categories.items],
+        "users": users.items,
+        "recipes": recipes.items,
+        "categories": categories.items,
         "users_count":
         users.total,
         "recipes_count":
@@ -486,12 +839,88 @@ def search(user):
         "categories_count":
         categories.total,
         "total_results":
-        users.total + recipes.total + categories.total,
+        sum(totals) if counted else None,
         "search_term":
         search_term,
         "total_pages": total_pages
     }
     if page > 1:
         response_body["previous_page"] = page - 1
+    if any(result.has_more for result in results.values()):
+        response_body["next_page"] = page + 1
+
+    cached = [result.cached for result in results.values()]
+    cache_status = "HIT" if all(cached) else "PARTIAL" if any(cached) else "MISS"
+    return jsonify(response_body), 200, {"X-Cache": cache_status}
+
+
+@app.route(f"{BASE_URL}search/suggest")
+@auth_token_required
+def suggest(user):
+    """ Suggests names of the user's recipes and recipe categories with a word starting with prefix """
+    prefix = str(request.args.get("prefix", "")).strip()
+    if not prefix:
+        return jsonify({
+            "errors": ["Check that you have supplied the prefix and try again"]
+        }), 400
+
+    return jsonify({
+        "suggestions":
+        suggester.suggest(user.id, prefix, get_page_limit(request.args))
+    }), 200
 
-    return jsonify(response_body), 200
+
+@app.route(f"{BASE_URL}admin/slow_queries", methods=["GET"])
+@auth_token_required
+@admin_required
+def get_slow_queries(user):
+    """ Gets the latest slow statements and the slowest ones with their plans """
+    return jsonify(slow_queries.entries()), 200
+
+
+@app.route(f"{BASE_URL}admin/slow_queries/dump", methods=["POST"])
+@auth_token_required
+@admin_required
+def dump_slow_queries(user):
+    """ Writes the slow query log to the YUMMY_SLOW_QUERY_DUMP file """
+    path = app.config["YUMMY_SLOW_QUERY_DUMP"]
+    try:
+        entries = slow_queries.dump(path)
+    except OSError as error:
+        return jsonify({
+            "errors": [f"The slow query log could not be written: {error.strerror}"]
+        }), 500
+    return jsonify({
+        "message": "Slow query log written",
+        "path": path,
+        "entries": entries
+    }), 200
+
+
+@app.route(f"{BASE_URL}admin/slow_queries", methods=["DELETE"])
+@auth_token_required
+@admin_required
+def clear_slow_queries(user):
+    """ Empties the slow query log """
+    slow_queries.clear()
+    return jsonify({"message": "Slow query log cleared"}), 200
+
+
+@app.route(f"{BASE_URL}admin/cache_stats", methods=["GET"])
+@auth_token_required
+@admin_required
+def get_cache_stats(user):
+    """ Gets the hit ratios of the caches and of the response cache of each end point,
+    the queue depth and latency of the password hashing pool and the use of the database pools
+    """
+    return jsonify({
+        "password_hasher": password_hasher.stats,
+        "database_pools": {
+            "primary": pool_stats(db.engine),
+            "replicas": router.pool_stats
+        },
+        "token_cache": token_cache.stats,
+        "search_cache": search_cache.stats,
+        "response_cache": response_cache.stats,
+        "response_cache_routes": response_cache_routes.stats
+    }), 200
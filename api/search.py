@@ -0,0 +1,294 @@
+""" The search module builds the queries behind the search end point
+LikeSearch matches the search terms anywhere in the searched columns and works on any database
+FullTextSearch matches whole words using postgres full text search on GIN indexed tsvector columns
+TrigramSearch matches partial and misspelt words using pg_trgm on GIN trigram indexes
+search runs the users, recipes and categories lookups concurrently, each on its own connection,
+and caches their serialized results
+"""
+import json
+import math
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+from flask import request
+from sqlalchemy import or_, func, text
+from sqlalchemy.orm import Session
+
+from api import app, db, models
+from api.cache import search_cache
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+SearchResult = namedtuple("SearchResult",
+                          ["items", "total", "has_more", "cached"])
+
+SERIALIZERS = {
+    "users": lambda user: user.user_details,
+    "recipes": lambda recipe: recipe.recipe_details,
+    "categories": lambda category: category.recipe_cat_details
+}
+
+
+class LikeSearch:
+    """ Finds items with any of the search terms anywhere in their searched columns """
+
+    @staticmethod
+    def _match(query, columns, terms):
+        """ Filters a query to rows where any column contains any of the terms """
+        return query.filter(
+            or_(*[column.like(f"%{term}%") for column in columns for term in terms]))
+
+    def users(self, query, terms):
+        """ Filters a users query to users matching the search terms """
+        return LikeSearch._match(query, [
+            models.User.firstname, models.User.lastname, models.User.email
+        ], terms)
+
+    def recipes(self, query, terms):
+        """ Filters a recipes query to recipes matching the search terms """
+        return LikeSearch._match(query, [
+            models.Recipe.name, models.Recipe.steps, models.Recipe.ingredients
+        ], terms)
+
+    def categories(self, query, terms):
+        """ Filters a recipe categories query to categories matching the search terms """
+        return LikeSearch._match(query, [models.RecipeCategory.name], terms)
+
+
+class FullTextSearch:
+    """ Finds items with any of the search terms in their search_vector column
+    ranking the best matches first
+    """
+
+    @staticmethod
+    def _match(query, model, terms, text_search_config):
+        """ Filters a query to rows matching any of the terms ordered by rank """
+        ts_query = reduce(lambda left, right: left.op("||")(right), [
+            func.plainto_tsquery(text_search_config, term) for term in terms
+        ])
+        # the column is left out of the models so that it is never loaded
+        search_vector = model.__table__.c.search_vector
+        return query.filter(search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(search_vector, ts_query).desc(), model.id)
+
+    def users(self, query, terms):
+        """ Filters a users query to users matching the search terms """
+        return FullTextSearch._match(query, models.User, terms, "simple")
+
+    def recipes(self, query, terms):
+        """ Filters a recipes query to recipes matching the search terms """
+        return FullTextSearch._match(query, models.Recipe, terms, "english")
+
+    def categories(self, query, terms):
+        """ Filters a recipe categories query to categories matching the search terms """
+        return FullTextSearch._match(query, models.RecipeCategory, terms,
+                                     "english")
+
+
+class TrigramSearch:
+    """ Finds items with a word similar to any of the search terms ranking the most similar first
+    It needs the pg_trgm extension and the trigram indexes created by the migrations,
+    which skip them on databases where pg_trgm is not available
+    """
+    installed = False
+
+    def __init__(self):
+        if not TrigramSearch.installed:
+            TrigramSearch.installed = db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).scalar() is not None
+        if not TrigramSearch.installed:
+            raise RuntimeError(
+                "The trigram search backend needs the pg_trgm extension and its indexes, "
+                "see the README or set YUMMY_SEARCH_BACKEND to like or fulltext")
+
+    @staticmethod
+    def _match(query, model, columns, terms):
+        """ Filters a query to rows where a word in any column is similar to any of the terms """
+        # word similarity threshold used by the %> operator in the current transaction
+        query.session.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', "
+                 ":threshold, true)"),
+            {"threshold": str(app.config["YUMMY_TRIGRAM_THRESHOLD"])})
+        similarities = [
+            func.word_similarity(term, column) for column in columns
+            for term in terms
+        ]
+        # the percent sign is doubled since psycopg2 uses it to mark parameters
+        return query.filter(
+            or_(*[
+                column.op("%%>")(term) for column in columns for term in terms
+            ])).order_by(func.greatest(*similarities).desc(), model.id)
+
+    def users(self, query, terms):
+        """ Filters a users query to users matching the search terms
+        Users are not trigram indexed so they are matched like the like backend does
+        """
+        return LikeSearch().users(query, terms)
+
+    def recipes(self, query, terms):
+        """ Filters a recipes query to recipes with a name or ingredient similar to the terms """
+        return TrigramSearch._match(
+            query, models.Recipe,
+            [models.Recipe.name, models.Recipe.ingredients], terms)
+
+    def categories(self, query, terms):
+        """ Filters a recipe categories query to categories with a name similar to the terms """
+        return TrigramSearch._match(query, models.RecipeCategory,
+                                    [models.RecipeCategory.name], terms)
+
+
+SEARCH_BACKENDS = {
+    "like": LikeSearch,
+    "fulltext": FullTextSearch,
+    "trigram": TrigramSearch
+}
+
+
+def get_search_backend():
+    """ Returns the search backend named by YUMMY_SEARCH_BACKEND
+    Databases other than postgres always use the like backend
+    """
+    backend = app.config.get("YUMMY_SEARCH_BACKEND", "like")
+    if db.engine.dialect.name != "postgresql":
+        backend = "like"
+    return SEARCH_BACKENDS.get(backend, LikeSearch)()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """ Creates the thread pool running the search lookups on first use """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config["YUMMY_SEARCH_WORKERS"])
+        return _executor
+
+
+def reset_executor():
+    """ Forgets the thread pool so that a forked worker process starts its own on first use """
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def _estimate_count(session, query):
+    """ Returns the number of rows postgres expects a query to return without running it """
+    statement = query.order_by(None).statement.compile(
+        dialect=session.bind.dialect)
+    plan = session.connection().execute(
+        "EXPLAIN (FORMAT JSON) " + str(statement), statement.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _lookup(session, build_query, page, per_page, count_mode):
+    """
+    Fetches a page of items and counts all the items matched by a query
+    :param session: The session to run the queries in
+    :param build_query: A function building the query given the session
+    :param page: The page to fetch starting from 1
+    :param per_page: The number of items per page
+    :param count_mode: exact counts all items, estimate asks the planner and none skips counting
+    :return: A SearchResult
+    """
+    query = build_query(session)
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    total = None
+    if count_mode == "estimate" and session.bind.dialect.name == "postgresql":
+        total = max(_estimate_count(session, query), len(items))
+    elif count_mode != "none":
+        total = query.order_by(None).count()
+    return SearchResult(items, total, has_more, False)
+
+
+def _isolated_lookup(engine, build_query, *args):
+    """ Runs a lookup on a session of its own so that it can run in another thread
+    The returned items are detached so everything they show must be eager loaded
+    """
+    session = Session(bind=engine)
+    try:
+        return _lookup(session, build_query, *args)
+    finally:
+        session.close()
+
+
+def _run_lookups(builders, page, per_page, count_mode):
+    """ Runs lookups concurrently when YUMMY_SEARCH_WORKERS is more than zero
+    :return: A dictionary with the SearchResult of each lookup
+    """
+    if not app.config["YUMMY_SEARCH_WORKERS"]:
+        return {
+            name: _lookup(db.session, build_query, page, per_page, count_mode)
+            for name, build_query in builders.items()
+        }
+
+    futures = {
+        name: _get_executor().submit(_isolated_lookup, db.session.get_bind(),
+                                     build_query, page, per_page, count_mode)
+        for name, build_query in builders.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def search(user_id, terms, page, per_page, count_mode="exact"):
+    """
+    Searches for users, a user's recipes and a user's recipe categories matching the terms
+    Serialized results are cached per lookup, users results are shared by all users
+    :return: A dictionary with SearchResults of serialized items under users, recipes and categories
+    """
+    backend = get_search_backend()
+    # the lookups match any of the terms so their order and repetition do not matter
+    terms = tuple(sorted(set(terms)))
+    builders = {
+        "users":
+        lambda session: backend.users(session.query(models.User), terms),
+        "recipes":
+        lambda session: backend.recipes(
+            session.query(models.Recipe).filter_by(owner=user_id).options(
+                models.Recipe.details_loader()), terms),
+        "categories":
+        lambda session: backend.categories(
+            session.query(models.RecipeCategory).filter_by(owner=user_id).
+            options(models.RecipeCategory.details_loader()), terms)
+    }
+    owners = {"users": None, "recipes": user_id, "categories": user_id}
+    keys = {
+        name: (name, owners[name], type(backend).__name__, terms, page,
+               per_page, count_mode, request.host_url)
+        for name in builders
+    }
+
+    use_cache = app.config["YUMMY_SEARCH_CACHE"]
+    results = dict()
+    for name, key in keys.items():
+        cached = search_cache.get(key) if use_cache else None
+        if cached is not None:
+            results[name] = cached._replace(cached=True)
+
+    found = _run_lookups(
+        {name: builders[name] for name in builders if name not in results},
+        page, per_page, count_mode)
+    for name, result in found.items():
+        result = result._replace(
+            items=[SERIALIZERS[name](item) for item in result.items])
+        if use_cache:
+            tags = ["users"] if owners[name] is None else [("owner", user_id)]
+            search_cache.set(
+                keys[name], result,
+                size=len(json.dumps(result.items, default=str)), tags=tags)
+        results[name] = result
+    return results
+
+
+def count_pages(total, per_page):
+    """ Returns the number of pages needed to show total items """
+    return int(math.ceil(total / per_page)) if total else 0
@@ -0,0 +1,150 @@
+""" The slowlog module keeps the statements that took longer than YUMMY_SLOW_QUERY_MS
+SlowQueryLog holds the latest slow statements in a ring buffer and the slowest ones with
+their EXPLAIN (ANALYZE, BUFFERS) plans, the parameters of the statements are redacted to their types
+and the constants in the plans to ?
+"""
+import heapq
+import itertools
+import json
+import re
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from psycopg2 import Error as DatabaseError
+
+from api import app
+
+# psycopg2 puts the parameters in the statement so the plan shows them as constants
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?(?![\w.])")
+
+
+def redact(parameters):
+    """ Replaces the bound parameters of a statement with the names of their types """
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def redact_plan(plan):
+    """ Replaces the string and number constants in the conditions and other texts of a plan with ? """
+    if isinstance(plan, dict):
+        return {key: redact_plan(value) for key, value in plan.items()}
+    if isinstance(plan, list):
+        return [redact_plan(value) for value in plan]
+    if isinstance(plan, str):
+        return SQL_NUMBER.sub("?", SQL_STRING.sub("'?'", plan))
+    return plan
+
+
+def explain(cursor, statement, parameters):
+    """ Runs a select statement again under EXPLAIN (ANALYZE, BUFFERS)
+    It runs in a savepoint on the connection of the statement so that it sees the same rows
+    and a failure does not abort the transaction
+    :return: The plan with its constants redacted or None if it could not be made
+    """
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT yummy_explain")
+        explain_cursor.execute(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        plan = redact_plan(explain_cursor.fetchone()[0])
+        explain_cursor.execute("RELEASE SAVEPOINT yummy_explain")
+        return plan
+    except DatabaseError:
+        try:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT yummy_explain")
+        except DatabaseError:
+            # the connection is in autocommit mode so there was no savepoint
+            pass
+        return None
+    finally:
+        explain_cursor.close()
+
+
+class SlowQueryLog:
+    """ The latest slow statements and the slowest ones with their plans
+    A plan is only made for a statement slower than one of the slowest kept
+    so that the statements are not run twice more often than needed
+    """
+
+    def __init__(self, size, plans):
+        self.plans = plans
+        self.recent = deque(maxlen=size)
+        self.slowest = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def wants_plan(self, duration_ms):
+        """ Tells whether a statement is slow enough to be kept with its plan """
+        with self._lock:
+            return len(self.slowest) < self.plans or (
+                self.slowest and duration_ms > self.slowest[0][0])
+
+    def add(self, entry):
+        """ Keeps a slow statement and, if it has one, its plan among the slowest """
+        with self._lock:
+            self.recent.append(entry)
+            if entry["plan"] is None or not self.plans:
+                return
+            item = (entry["duration_ms"], next(self._order), entry)
+            if len(self.slowest) < self.plans:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+
+    def entries(self):
+        """ Returns the latest slow statements, newest first, and the slowest ones with their plans """
+        with self._lock:
+            return {
+                "recent": list(reversed(self.recent)),
+                "slowest":
+                [entry for _, _, entry in sorted(self.slowest, reverse=True)]
+            }
+
+    def dump(self, path):
+        """ Writes the entries to a json file
+        :return: The number of entries written
+        """
+        entries = self.entries()
+        with open(path, "w") as dump_file:
+            json.dump(entries, dump_file, indent=2, default=str)
+        return len(entries["recent"]) + len(entries["slowest"])
+
+    def clear(self):
+        """ Removes all entries """
+        with self._lock:
+            self.recent.clear()
+            self.slowest.clear()
+
+
+slow_queries = SlowQueryLog(app.config["YUMMY_SLOW_QUERY_LOG_SIZE"],
+                            app.config["YUMMY_SLOW_QUERY_PLANS"])
+
+
+def record_if_slow(cursor, statement, parameters, duration, executemany):
+    """ Adds a statement that took duration seconds to the slow query log if it was slow """
+    duration_ms = duration * 1000
+    threshold = app.config["YUMMY_SLOW_QUERY_MS"]
+    if not threshold or duration_ms < threshold:
+        return
+    plan = None
+    # explain analyze runs the statement again so only selects are explained
+    if (not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and slow_queries.wants_plan(duration_ms)):
+        plan = explain(cursor, statement, parameters)
+    in_request = has_request_context()
+    slow_queries.add({
+        "statement": statement,
+        "parameters": None if executemany else redact(parameters),
+        "duration_ms": round(duration_ms, 2),
+        "endpoint": request.endpoint if in_request else None,
+        "method": request.method if in_request else None,
+        "recorded": datetime.utcnow().isoformat(),
+        "plan": plan
+    })
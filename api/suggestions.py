@@ -0,0 +1,129 @@
+""" The suggestions module serves type ahead suggestions of recipe and recipe category names
+PrefixIndex keeps the names of one user in a sorted list searched with bisect
+Suggester builds a user's index on first use, keeps it up to date as the user makes changes
+and drops the indexes of users who have not used them for a while
+"""
+import threading
+from bisect import bisect_left, insort
+
+from api import app, db, models
+from api.cache import LRUCache
+
+
+class PrefixIndex:
+    """ A sorted list of name keys where every word of a name starts a key
+    so that a prefix matches the start of any word in a name
+    """
+
+    def __init__(self, items=()):
+        """
+        PrefixIndex initializer
+        :param items: (name, kind, id) tuples to index
+        """
+        self._keys = sorted(
+            key for item in items for key in PrefixIndex._keys_of(*item))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys_of(name, kind, item_id):
+        """ Returns a key for each word in a name """
+        lowered = name.lower()
+        starts = [0] + [
+            position + 1 for position, char in enumerate(lowered)
+            if char == " "
+        ]
+        return [(lowered[start:], name, kind, item_id) for start in starts]
+
+    def add(self, name, kind, item_id):
+        """ Adds a name to the index """
+        with self._lock:
+            for key in PrefixIndex._keys_of(name, kind, item_id):
+                insort(self._keys, key)
+
+    def remove(self, name, kind, item_id):
+        """ Removes a name from the index """
+        with self._lock:
+            for key in PrefixIndex._keys_of(name, kind, item_id):
+                position = bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+
+    def search(self, prefix, limit):
+        """ Returns up to limit (name, kind, id) tuples with a word starting with prefix """
+        prefix = prefix.lower()
+        found = []
+        with self._lock:
+            position = bisect_left(self._keys, (prefix, ))
+            while position < len(self._keys) and len(found) < limit:
+                key, name, kind, item_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if (name, kind, item_id) not in found:
+                    found.append((name, kind, item_id))
+                position += 1
+        return found
+
+
+class Suggester:
+    """ Keeps a prefix index for each active user """
+
+    def __init__(self, max_users=1000, ttl=300):
+        """
+        Suggester initializer
+        :param max_users: The maximum number of user indexes kept at a time
+        :param ttl: Seconds after which an index is rebuilt from the database
+        """
+        self._indexes = LRUCache(max_users, ttl)
+
+    @staticmethod
+    def _build(user_id):
+        """ Builds the prefix index of a user from the database """
+        recipes = db.session.query(
+            models.Recipe.name, models.Recipe.id).filter_by(owner=user_id)
+        categories = db.session.query(
+            models.RecipeCategory.name,
+            models.RecipeCategory.id).filter_by(owner=user_id)
+        return PrefixIndex(
+            [(name, "recipe", item_id) for name, item_id in recipes] +
+            [(name, "category", item_id) for name, item_id in categories])
+
+    def suggest(self, user_id, prefix, limit=10):
+        """ Returns the names of a user's recipes and categories with a word starting with prefix """
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = Suggester._build(user_id)
+            self._indexes.set(user_id, index)
+        return [{
+            "name": name,
+            "type": kind,
+            "id": item_id
+        } for name, kind, item_id in index.search(prefix, limit)]
+
+    def added(self, user_id, name, kind, item_id):
+        """ Adds a new name to the index of a user if it has been built """
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(name, kind, item_id)
+
+    def removed(self, user_id, name, kind, item_id):
+        """ Removes a name from the index of a user if it has been built """
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(name, kind, item_id)
+
+    def renamed(self, user_id, old_name, new_name, kind, item_id):
+        """ Replaces a name in the index of a user """
+        self.removed(user_id, old_name, kind, item_id)
+        self.added(user_id, new_name, kind, item_id)
+
+    def forget(self, user_id):
+        """ Drops the index of a user so that it is rebuilt on next use """
+        self._indexes.delete(user_id)
+
+    def clear(self):
+        """ Drops all indexes """
+        self._indexes.clear()
+
+
+suggester = Suggester(app.config["YUMMY_SUGGEST_MAX_USERS"],
+                      app.config["YUMMY_SUGGEST_TTL"])
@@ -98,6 +98,8 @@ class Validate:
             return validation_errors
 
         except KeyError:
+            # the errors found before the missing key must not show up in the next validation
+            self.__errors = list()
             raise ValidationError(
                 "Validation failure: Check that you sent all the required data and try again"
             )
@@ -0,0 +1,61 @@
+""" Benchmarks encoding a listing of 1000 recipes with the standard library and the fast encoder
+Run it from the root of the repository with python -m benchmarks.json_encoding
+No database is needed, the recipes are built in memory
+"""
+import timeit
+from datetime import datetime
+
+from flask import jsonify
+
+from api import app
+from api.encoding import orjson
+from api.models import User, Recipe, RecipeCategory
+
+RECIPES = 1000
+REPEAT = 5
+NUMBER = 10
+
+
+def make_listing():
+    """ Returns the details of RECIPES recipes as the recipes end point shows them """
+    user = User.__mapper__.class_manager.new_instance()
+    user.id, user.firstname, user.lastname = 1, "Jjagwe", "Dennis"
+    user.email, user.mobile = "dennisjjagwe@gmail.com", None
+    category = RecipeCategory("Break Fast", user.id)
+    category.id, category.creator = 1, user
+    category.created = category.edited = datetime.utcnow()
+    recipes = []
+    for number in range(RECIPES):
+        recipe = Recipe(f"Recipe {number}", "1.Peal Matooke 2.Cook 3.Eat " * 30,
+                        "Matooke, Tomatoes, Onions, Salt", category.id, user.id)
+        recipe.id, recipe.recipe_category = number + 1, category
+        recipe.privacy, recipe.favourite = 1, 0
+        recipe.created = recipe.edited = datetime.utcnow()
+        recipes.append(recipe.recipe_details)
+    return {"recipes": recipes, "next_cursor": None}
+
+
+def encode_time(listing, encoder):
+    """ Returns the best time in milliseconds taken to jsonify the listing with an encoder """
+    app.config["YUMMY_JSON_ENCODER"] = encoder
+    times = timeit.repeat(
+        lambda: jsonify(listing), repeat=REPEAT, number=NUMBER)
+    return min(times) / NUMBER * 1000
+
+
+def main():
+    with app.test_request_context():
+        listing = make_listing()
+        size = len(jsonify(listing).get_data())
+        print(f"{RECIPES} recipes, {size} bytes")
+        stdlib = encode_time(listing, "stdlib")
+        print(f"stdlib  {stdlib:8.2f} ms")
+        if orjson is None:
+            print("fast     orjson is not installed")
+            return
+        fast = encode_time(listing, "fast")
+        print(f"fast    {fast:8.2f} ms  {stdlib / fast:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+""" The gunicorn configuration, used with: gunicorn -c gunicorn.conf.py run:app """
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+# loading the app before forking shares its memory between the workers
+preload_app = os.environ.get("YUMMY_PRELOAD_APP", "false").lower() == "true"
+
+
+def post_fork(server, worker):
+    """ Drops the database and replica connections, hashing processes and search threads a worker
+    inherits from a preloaded app so that each worker makes its own
+    """
+    from api import db, search, replicas
+    from api.hashing import password_hasher
+
+    db.engine.dispose()
+    replicas.router.dispose()
+    password_hasher.reset()
+    search.reset_executor()
@@ -8,5 +8,18 @@ manager = Manager(app)
 
 manager.add_command("db", MigrateCommand)
 
+
+@manager.command
+def index_ingredients():
+    """ Builds the ingredient index of recipes saved before the index existed """
+    indexed = 0
+    for recipe in models.Recipe.query.order_by(models.Recipe.id).yield_per(500):
+        recipe.index_ingredients()
+        indexed += 1
+        if indexed % 500 == 0:
+            db.session.commit()
+    db.session.commit()
+    print(f"Indexed the ingredients of {indexed} recipes")
+
 if __name__ == "__main__":
     manager.run()
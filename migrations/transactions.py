@@ -0,0 +1,22 @@
+""" The transactions module helps migrations run statements postgres refuses inside a transaction
+such as CREATE INDEX CONCURRENTLY
+"""
+from contextlib import contextmanager
+
+from alembic import op
+
+
+@contextmanager
+def outside_transaction():
+    """
+    Commits the migration so far and runs the statements of the block in autocommit mode
+    The statements after the block run in a new transaction committed with the migration,
+    so a failure after the block only rolls back what came after it
+    """
+    dbapi_connection = op.get_bind().connection.connection
+    dbapi_connection.commit()
+    dbapi_connection.autocommit = True
+    try:
+        yield
+    finally:
+        dbapi_connection.autocommit = False
@@ -0,0 +1,34 @@
+"""add the ingredient index
+
+Revision ID: 2e8b5f04d9c1
+Revises: c4d9e0a7b613
+Create Date: 2026-10-18 11:25:48.306117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e8b5f04d9c1'
+down_revision = 'c4d9e0a7b613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fill it for existing recipes with: python migrate.py index_ingredients
+    op.create_table('recipe_ingredients',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=100), nullable=False),
+    sa.Column('owner', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('recipe_id', 'token')
+    )
+    op.create_index('ix_recipe_ingredients_owner_token_recipe_id', 'recipe_ingredients', ['owner', 'token', 'recipe_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_recipe_ingredients_owner_token_recipe_id', table_name='recipe_ingredients')
+    op.drop_table('recipe_ingredients')
@@ -0,0 +1,26 @@
+"""delete the recipes of a deleted category in the database
+
+Revision ID: 3c6e8a2f0b95
+Revises: 9d4f2b7e1a38
+Create Date: 2026-10-18 13:20:52.773410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c6e8a2f0b95'
+down_revision = '9d4f2b7e1a38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('recipes_category_id_fkey', 'recipes', type_='foreignkey')
+    op.create_foreign_key('recipes_category_id_fkey', 'recipes', 'recipe_categories', ['category_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('recipes_category_id_fkey', 'recipes', type_='foreignkey')
+    op.create_foreign_key('recipes_category_id_fkey', 'recipes', 'recipe_categories', ['category_id'], ['id'])
@@ -0,0 +1,30 @@
+"""add indexes used by cursor pagination
+
+Revision ID: 5b1e7d2c9a04
+Revises: d03a964116c4
+Create Date: 2026-10-18 09:12:40.512093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7d2c9a04'
+down_revision = 'd03a964116c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_created_id', 'users', ['created', 'id'], unique=False)
+    op.create_index('ix_recipe_categories_owner_created_id', 'recipe_categories', ['owner', 'created', 'id'], unique=False)
+    op.create_index('ix_recipes_owner_created_id', 'recipes', ['owner', 'created', 'id'], unique=False)
+    op.create_index('ix_recipes_category_id_created_id', 'recipes', ['category_id', 'created', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_recipes_category_id_created_id', table_name='recipes')
+    op.drop_index('ix_recipes_owner_created_id', table_name='recipes')
+    op.drop_index('ix_recipe_categories_owner_created_id', table_name='recipe_categories')
+    op.drop_index('ix_users_created_id', table_name='users')
@@ -0,0 +1,32 @@
+"""add indexes used by the duplicate name checks
+
+Revision ID: 7a1c3e9b5d20
+Revises: 2e8b5f04d9c1
+Create Date: 2026-10-18 12:03:17.640218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.transactions import outside_transaction
+
+
+# revision identifiers, used by Alembic.
+revision = '7a1c3e9b5d20'
+down_revision = '2e8b5f04d9c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # indexes are built concurrently so that writes to the tables go on while they are built,
+    # postgres does not allow that inside a transaction
+    with outside_transaction():
+        op.create_index('ix_recipes_owner_category_id_name', 'recipes', ['owner', 'category_id', 'name'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_recipe_categories_owner_name', 'recipe_categories', ['owner', 'name'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with outside_transaction():
+        op.execute('DROP INDEX CONCURRENTLY ix_recipe_categories_owner_name')
+        op.execute('DROP INDEX CONCURRENTLY ix_recipes_owner_category_id_name')
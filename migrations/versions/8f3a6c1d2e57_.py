@@ -0,0 +1,43 @@
+"""add full text search vectors
+
+Revision ID: 8f3a6c1d2e57
+Revises: 5b1e7d2c9a04
+Create Date: 2026-10-18 10:02:17.842561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a6c1d2e57'
+down_revision = '5b1e7d2c9a04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # generated columns need postgres 12 or newer
+    op.execute(
+        "ALTER TABLE users ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple'::regconfig, firstname || ' ' || lastname || ' ' || email)) STORED")
+    op.execute(
+        "ALTER TABLE recipes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(setweight(to_tsvector('english'::regconfig, name), 'A') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce(ingredients, '')), 'B') || "
+        "setweight(to_tsvector('english'::regconfig, coalesce(steps, '')), 'C')) STORED")
+    op.execute(
+        "ALTER TABLE recipe_categories ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('english'::regconfig, name)) STORED")
+    op.create_index('ix_users_search_vector', 'users', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_recipes_search_vector', 'recipes', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_recipe_categories_search_vector', 'recipe_categories', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_recipe_categories_search_vector', table_name='recipe_categories')
+    op.drop_index('ix_recipes_search_vector', table_name='recipes')
+    op.drop_index('ix_users_search_vector', table_name='users')
+    op.drop_column('recipe_categories', 'search_vector')
+    op.drop_column('recipes', 'search_vector')
+    op.drop_column('users', 'search_vector')
@@ -0,0 +1,64 @@
+"""enforce unique names and emails in the database
+
+Revision ID: 9d4f2b7e1a38
+Revises: 7a1c3e9b5d20
+Create Date: 2026-10-18 12:41:05.218934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.transactions import outside_transaction
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f2b7e1a38'
+down_revision = '7a1c3e9b5d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # emails differing only by case belong to accounts that cannot be merged without their owners,
+    # so they are reported before anything is changed
+    duplicate_emails = op.get_bind().execute("""
+        SELECT string_agg(email, ', ' ORDER BY id) FROM users
+        GROUP BY lower(email) HAVING count(*) > 1
+    """).fetchall()
+    if duplicate_emails:
+        raise RuntimeError(
+            "Users with emails differing only by case must be merged or given other emails "
+            "before the unique index on lower(email) is made: "
+            + "; ".join(emails for emails, in duplicate_emails))
+    # duplicates let in by concurrent requests keep their name, shortened to fit, with their id appended
+    op.execute("""
+        UPDATE recipe_categories AS duplicate
+        SET name = left(duplicate.name, 200 - length(' ' || duplicate.id)) || ' ' || duplicate.id
+        FROM recipe_categories AS original
+        WHERE original.owner = duplicate.owner AND original.name = duplicate.name
+        AND original.id < duplicate.id
+    """)
+    op.execute("""
+        UPDATE recipes AS duplicate
+        SET name = left(duplicate.name, 200 - length(' ' || duplicate.id)) || ' ' || duplicate.id
+        FROM recipes AS original
+        WHERE original.owner = duplicate.owner AND original.category_id = duplicate.category_id
+        AND original.name = duplicate.name AND original.id < duplicate.id
+    """)
+    # the unique indexes are built concurrently, see 7a1c3e9b5d20
+    with outside_transaction():
+        op.create_index('uq_recipe_categories_owner_name', 'recipe_categories', ['owner', 'name'], unique=True, postgresql_concurrently=True)
+        op.create_index('uq_recipes_owner_category_id_name', 'recipes', ['owner', 'category_id', 'name'], unique=True, postgresql_concurrently=True)
+        op.create_index('uq_users_lower_email', 'users', [sa.text('lower(email)')], unique=True, postgresql_concurrently=True)
+        # the unique indexes serve the lookups these were added for
+        op.execute('DROP INDEX CONCURRENTLY ix_recipe_categories_owner_name')
+        op.execute('DROP INDEX CONCURRENTLY ix_recipes_owner_category_id_name')
+
+
+def downgrade():
+    with outside_transaction():
+        op.create_index('ix_recipes_owner_category_id_name', 'recipes', ['owner', 'category_id', 'name'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_recipe_categories_owner_name', 'recipe_categories', ['owner', 'name'], unique=False, postgresql_concurrently=True)
+        op.execute('DROP INDEX CONCURRENTLY uq_users_lower_email')
+        op.execute('DROP INDEX CONCURRENTLY uq_recipes_owner_category_id_name')
+        op.execute('DROP INDEX CONCURRENTLY uq_recipe_categories_owner_name')
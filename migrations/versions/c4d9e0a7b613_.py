@@ -0,0 +1,45 @@
+"""add trigram indexes for fuzzy search
+
+Revision ID: c4d9e0a7b613
+Revises: 8f3a6c1d2e57
+Create Date: 2026-10-18 10:41:03.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e0a7b613'
+down_revision = '8f3a6c1d2e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # trigram search is optional, so the extension and its indexes are skipped on databases
+    # where pg_trgm is not available or may not be created, the trigram backend then refuses to run
+    connection = op.get_bind()
+    available = connection.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    if not available:
+        print("pg_trgm is not available, skipping the trigram indexes")
+        return
+    savepoint = connection.begin_nested()
+    try:
+        connection.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        savepoint.commit()
+    except sa.exc.DBAPIError as error:
+        savepoint.rollback()
+        print(f"pg_trgm could not be created, skipping the trigram indexes: {error.orig}")
+        return
+    op.create_index('ix_recipes_name_trgm', 'recipes', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_recipes_ingredients_trgm', 'recipes', ['ingredients'], unique=False, postgresql_using='gin', postgresql_ops={'ingredients': 'gin_trgm_ops'})
+    op.create_index('ix_recipe_categories_name_trgm', 'recipe_categories', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    # the indexes were not made if pg_trgm was missing
+    op.execute("DROP INDEX IF EXISTS ix_recipe_categories_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_recipes_ingredients_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_recipes_name_trgm")
@@ -6,9 +6,18 @@ The module has application specific tests
 import unittest
 import json
 from base64 import b64encode
+from contextlib import contextmanager
+
+# third party imports
+from sqlalchemy import event
 
 # application specific imports
 from api import app, db
+from api.cache import token_cache, search_cache, response_cache, response_cache_routes
+from api.compression import compressed_bodies
+from api.ratelimit import rate_limiter
+from api.suggestions import suggester
+from api.slowlog import slow_queries
 from api.validator import Validate, ValidationError
 from api.models import User, Recipe, RecipeCategory
 from config import CONFIGS as configs
@@ -102,13 +111,12 @@ class ApiBasicsTestCase(unittest.TestCase):
         return self.test_client().post("/yummy/api/v1.0/auth/register/",
                                        **self.kwargs)
 
-    def login_user(self, user_details):
+    def login_user(self, user_details, headers=None):
         """ Logs in a user """
         credentials = f"{user_details['username']}:{user_details['password']}"
-        headers = {
-            "Authorization":
+        headers = dict(headers or {})
+        headers["Authorization"] = \
             f"Basic {b64encode(bytes(credentials,'utf-8')).decode('ascii')}"
-        }
         return self.test_client().post(
             "/yummy/api/v1.0/auth/login/", headers=headers)
 
@@ -152,7 +160,29 @@ class ApiBasicsTestCase(unittest.TestCase):
         return self.test_client().patch("/yummy/api/v1.0/users/",
                                         **self.kwargs)
 
+    @contextmanager
+    def record_queries(self):
+        """ Records the sql statements sent to the database within the with block """
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
     def tearDown(self):
+        token_cache.clear()
+        search_cache.clear()
+        response_cache.clear()
+        response_cache_routes.clear()
+        rate_limiter.store.clear()
+        suggester.clear()
+        slow_queries.clear()
+        compressed_bodies.clear()
         db.session.remove()
         db.drop_all()
         self.app_context.pop()
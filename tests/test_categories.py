@@ -3,6 +3,7 @@ This module has tests for RecipeCategories functionality in the api
 """
 import json
 
+from api.models import Recipe, RecipeCategory, RecipeIngredient
 from tests import ApiBasicsTestCase
 
 
@@ -180,6 +181,63 @@ class CategoryTestCases(ApiBasicsTestCase):
         self.assertIn("Recipe Category successfully deleted",
                       delete_response.data.decode())
 
+    def test_delete_category_cascades_in_database(self):
+        """ tests that a category is deleted with one statement and its recipes go with it """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, login_token)
+
+        self.kwargs.pop("data")
+        with self.record_queries() as statements:
+            delete_response = self.test_client().delete(
+                "/yummy/api/v1.0/recipe_categories/1", **self.kwargs)
+        self.assertEqual(delete_response.status_code, 200)
+        # the recipes of the category are not loaded to be deleted one by one
+        self.assertEqual(
+            [statement for statement in statements
+             if "FROM recipes" in " ".join(statement.split())], [])
+        self.assertEqual(
+            [statement for statement in statements
+             if not statement.startswith("SELECT")],
+            ["DELETE FROM recipe_categories WHERE recipe_categories.id = %(id)s"])
+        self.assertEqual(Recipe.query.count(), 0)
+        self.assertEqual(RecipeIngredient.query.count(), 0)
+
+    def test_merge_categories(self):
+        """ tests that a category is merged into another unless recipe names clash """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        for category in self.sample_categories:
+            self.create_recipe_category(category, login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        self.create_recipe(self.sample_recipes[1], login_token)
+        self.create_recipe(dict(self.sample_recipes[0], category="2"),
+                           login_token)
+
+        def merge(category_id, into):
+            """ Merges a category into another """
+            self.kwargs["data"] = json.dumps({"into": into})
+            response = self.test_client().post(
+                f"/yummy/api/v1.0/recipe_categories/{category_id}/merge",
+                **self.kwargs)
+            return response.status_code, json.loads(response.data.decode())
+
+        status, data = merge(1, 2)
+        self.assertEqual(status, 200)
+        self.assertEqual(data["moved"], [2])
+        self.assertEqual(data["conflicts"], [{"id": 1, "name": "Banana Crumbs"}])
+        self.assertFalse(data["category_deleted"])
+
+        status, data = merge(1, 3)
+        self.assertEqual(data["moved"], [1])
+        self.assertTrue(data["category_deleted"])
+        self.assertIsNone(RecipeCategory.query.get(1))
+
+        self.assertEqual(merge(2, 2)[0], 400)
+        self.assertEqual(merge(2, 1)[0], 404)
+
     def test_delete_other_category(self):
         """ test whether a user can only delete his/her own category """
         # register and login a user
@@ -0,0 +1,72 @@
+""" This module has tests for compressing response bodies
+"""
+import gzip
+
+from api.compression import compressed_bodies
+from tests import ApiBasicsTestCase
+
+
+class CompressionTestCases(ApiBasicsTestCase):
+    """ Tests negotiating the encoding of responses and reusing compressed bodies """
+
+    def setUp(self):
+        super().setUp()
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, self.login_token)
+
+    def get(self, accept_encoding=None, etag=None):
+        """ Gets the recipes of the user """
+        headers = {"x-access-token": self.login_token}
+        if accept_encoding:
+            headers["Accept-Encoding"] = accept_encoding
+        if etag:
+            headers["If-None-Match"] = etag
+        return self.test_client().get("/yummy/api/v1.0/recipes/",
+                                      headers=headers)
+
+    def test_gzip_negotiated(self):
+        """ Test that a large body is compressed for clients accepting gzip """
+        plain = self.get()
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+        self.assertGreater(
+            len(plain.data), self.app.config["YUMMY_COMPRESS_MIN_BYTES"])
+
+        response = self.get("br;q=0, gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertEqual(int(response.headers["Content-Length"]),
+                         len(response.data))
+        self.assertLess(len(response.data), len(plain.data))
+        # the compressed response is only weakly the same as the plain one
+        self.assertEqual(response.headers["ETag"],
+                         "W/" + plain.headers["ETag"])
+
+        self.assertNotIn("Content-Encoding",
+                         self.get("gzip;q=0").headers)
+
+    def test_small_body_not_compressed(self):
+        """ Test that bodies below the threshold are sent as they are """
+        self.app.config["YUMMY_COMPRESS_MIN_BYTES"] = 1024 * 1024
+        response = self.get("gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertTrue(response.headers["ETag"].startswith('"'))
+
+    def test_compressed_body_reused(self):
+        """ Test that an unchanged response is compressed once """
+        first = self.get("gzip")
+        misses = compressed_bodies.misses
+        second = self.get("gzip")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(compressed_bodies.misses, misses)
+        self.assertEqual(compressed_bodies.hits, 1)
+
+        # the weak etag of the compressed response gets a 304 carrying it
+        response = self.get("gzip", first.headers["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], first.headers["ETag"])
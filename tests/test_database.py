@@ -0,0 +1,61 @@
+""" This module has tests for the database engine and connection pool settings
+"""
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool
+
+from api import db
+from api.database import TimedQueuePool, pool_stats
+from tests import ApiBasicsTestCase
+
+
+class DatabaseTestCases(ApiBasicsTestCase):
+    """ Tests the engine made from the YUMMY_DB settings """
+
+    def test_connection_settings(self):
+        """ Test that connections carry the application name and statement timeout """
+        self.assertIsInstance(db.engine.pool, TimedQueuePool)
+        self.assertEqual(
+            db.session.execute("SHOW application_name").scalar(),
+            self.app.config["YUMMY_DB_APPLICATION_NAME"])
+        self.assertEqual(
+            db.session.execute("SHOW statement_timeout").scalar(),
+            f"{self.app.config['YUMMY_DB_STATEMENT_TIMEOUT'] // 1000}s")
+
+    def test_pool_stats(self):
+        """ Test that checkouts and their waits are counted """
+        checkouts = pool_stats(db.engine)["checkouts"]
+        with db.engine.connect() as connection:
+            connection.execute("SELECT 1")
+            stats = pool_stats(db.engine)
+        self.assertEqual(stats["checkouts"], checkouts + 1)
+        self.assertGreaterEqual(stats["checked_out"], 1)
+        self.assertGreaterEqual(stats["max_wait"], stats["average_wait"])
+
+    def test_pgbouncer_mode(self):
+        """ Test that nothing is pooled or set per connection when using PgBouncer """
+        self.app.config["YUMMY_DB_PGBOUNCER"] = True
+        _, options = db.apply_driver_hacks(
+            self.app, make_url(self.app.config["SQLALCHEMY_DATABASE_URI"]),
+            dict())
+        self.assertIs(options["poolclass"], NullPool)
+        self.assertNotIn("options", options["connect_args"])
+        self.assertNotIn("pool_size", options)
+
+    def test_postgresql_only_schema(self):
+        """ Test that the search columns and their indexes are only made on postgres """
+        self.assertIn(
+            "search_vector",
+            [column["name"] for column in inspect(db.engine).get_columns("recipes")])
+        self.assertIn(
+            "ix_recipes_search_vector",
+            [index["name"] for index in inspect(db.engine).get_indexes("recipes")])
+
+        engine = create_engine("sqlite://")
+        db.metadata.create_all(engine)
+        self.assertNotIn(
+            "search_vector",
+            [column["name"] for column in inspect(engine).get_columns("recipes")])
+        self.assertNotIn(
+            "ix_recipes_search_vector",
+            [index["name"] for index in inspect(engine).get_indexes("recipes")])
@@ -0,0 +1,49 @@
+""" This module has tests for the JSON encoding of responses
+"""
+import json
+import unittest
+
+from api.encoding import orjson
+from tests import ApiBasicsTestCase
+
+ISO_DATETIME = r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?$"
+
+
+class EncodingTestCases(ApiBasicsTestCase):
+    """ Tests the encoders give the same compact responses with ISO-8601 datetimes """
+
+    def setUp(self):
+        super().setUp()
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        self.create_recipe(self.sample_recipes[0], self.login_token)
+        # every encoding is made afresh
+        self.app.config["YUMMY_RESPONSE_CACHE"] = False
+
+    def get_recipes(self, encoder):
+        """ Gets the recipes of the user encoded with the given encoder """
+        self.app.config["YUMMY_JSON_ENCODER"] = encoder
+        return self.test_client().get(
+            "/yummy/api/v1.0/recipes/",
+            headers={"x-access-token": self.login_token}).data
+
+    def test_compact_iso_datetimes(self):
+        """ Test that responses are compact in debug mode and show datetimes in ISO-8601 """
+        self.assertTrue(self.app.debug)
+        body = self.get_recipes("stdlib")
+        self.assertNotIn(b"\n  ", body)
+        recipe = json.loads(body)["recipes"][0]
+        self.assertRegex(recipe["created"], ISO_DATETIME)
+        self.assertRegex(recipe["category"]["edited"], ISO_DATETIME)
+
+        self.app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
+        self.assertIn(b"\n  ", self.get_recipes("stdlib"))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_fast_encoder_same_data(self):
+        """ Test that the orjson encoder gives the same data as the standard library """
+        fast = self.get_recipes("fast")
+        self.assertNotIn(b"\n  ", fast)
+        self.assertEqual(json.loads(fast), json.loads(self.get_recipes("stdlib")))
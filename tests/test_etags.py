@@ -0,0 +1,88 @@
+""" This module has tests for answering unchanged GET requests with 304 Not Modified
+"""
+import json
+
+from tests import ApiBasicsTestCase
+
+
+class ETagTestCases(ApiBasicsTestCase):
+    """ Tests the ETags of the recipe and recipe category end points """
+
+    def setUp(self):
+        super().setUp()
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        self.create_recipe(self.sample_recipes[0], self.login_token)
+
+    def get(self, url, etag=None):
+        """ Gets an end point, sending an etag in If-None-Match if given """
+        headers = {"x-access-token": self.login_token}
+        if etag:
+            headers["If-None-Match"] = etag
+        return self.test_client().get("/yummy/api/v1.0/" + url,
+                                      headers=headers)
+
+    def change(self, method, url, data):
+        """ Changes data through an end point """
+        return getattr(self.test_client(), method)(
+            "/yummy/api/v1.0/" + url,
+            data=json.dumps(data),
+            content_type="application/json",
+            headers={"x-access-token": self.login_token})
+
+    def assert_not_modified(self, url):
+        """ Gets an end point twice and checks the second answer is a 304 without a body
+        :return: The etag of the end point
+        """
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        with self.record_queries() as statements:
+            response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        # only the version of the data is read
+        self.assertEqual(len(statements), 1)
+        return etag
+
+    def test_not_modified(self):
+        """ Test that every read end point answers 304 while its data is unchanged """
+        for url in ["recipes/", "recipes/1", "recipe_categories/",
+                    "recipe_categories/1", "recipe_categories/1/recipes/"]:
+            self.assert_not_modified(url)
+        # weak validators from caches that compressed the response also match
+        etag = self.get("recipes/").headers["ETag"]
+        self.assertEqual(
+            self.get("recipes/", "W/" + etag).status_code, 304)
+
+    def test_changes_make_new_etags(self):
+        """ Test that adding, editing and deleting recipes and renaming categories change the etags """
+        urls = ["recipes/", "recipes/1", "recipe_categories/1/recipes/"]
+        changes = [
+            ("put", "recipes/1", dict(self.sample_recipes[0], name="Jam")),
+            ("put", "recipe_categories/1", self.sample_categories[1]),
+            ("post", "recipes/", self.sample_recipes[1]),
+        ]
+        for change in changes:
+            etags = {url: self.assert_not_modified(url) for url in urls}
+            self.assertLess(self.change(*change).status_code, 300)
+            for url, etag in etags.items():
+                response = self.get(url, etag)
+                if change[0] == "post" and url == "recipes/1":
+                    self.assertEqual(response.status_code, 304)
+                else:
+                    self.assertEqual(response.status_code, 200, url)
+                    self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_deleted_item_not_modified(self):
+        """ Test that a deleted item is not answered with 304 """
+        etag = self.assert_not_modified("recipe_categories/1/recipes/")
+        self.test_client().delete(
+            "/yummy/api/v1.0/recipe_categories/1",
+            headers={"x-access-token": self.login_token})
+        response = self.get("recipe_categories/1/recipes/", etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response.headers)
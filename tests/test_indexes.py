@@ -0,0 +1,125 @@
+""" This module has tests checking that the queries made by the api are served by indexes
+"""
+import json
+
+from sqlalchemy import event
+
+from api import db
+from api.cache import token_cache
+from tests import ApiBasicsTestCase
+
+
+def unindexed_reads(plan):
+    """ Returns the nodes of a query plan reading rows that no index picked out
+    These are sequential scans and index scans filtering rows on columns the index lacks,
+    unless the rows are looked up by id
+    """
+    reads = []
+    if plan["Node Type"] == "Seq Scan":
+        reads.append(f"Seq Scan on {plan['Relation Name']}")
+    elif "Filter" in plan and "(id = " not in plan.get(
+            "Index Cond", "") + plan["Filter"]:
+        reads.append(f"{plan['Node Type']} filtering {plan['Filter']}")
+    for child in plan.get("Plans", []):
+        reads.extend(unindexed_reads(child))
+    return reads
+
+
+class IndexTestCases(ApiBasicsTestCase):
+    """ Runs the recipe and recipe category end points and explains every query they make """
+
+    def run_end_points(self):
+        """ Calls the end points querying recipes and recipe categories
+        :return: The select statements sent to the database with their parameters
+        """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        client = self.test_client()
+
+        def call(method, url, data=None):
+            """ Calls an end point with the token cache empty so the user is looked up too """
+            token_cache.clear()
+            if data is not None:
+                return getattr(client, method)(
+                    url,
+                    data=json.dumps(data),
+                    content_type="application/json",
+                    headers=headers)
+            return getattr(client, method)(url, headers=headers)
+
+        base = "/yummy/api/v1.0/"
+        # the refused duplicates use up an id, so the next recipe and category get 3
+        calls = [
+            ("post", "recipe_categories/", self.sample_categories[0], 201),
+            ("post", "recipe_categories/", self.sample_categories[0], 400),
+            ("put", "recipe_categories/1", self.sample_categories[1], 200),
+            ("get", "recipe_categories/1", None, 200),
+            ("get", "recipe_categories/", None, 200),
+            ("post", "recipes/", self.sample_recipes[0], 201),
+            ("post", "recipes/", self.sample_recipes[0], 400),
+            ("post", "recipes/", self.sample_recipes[1], 201),
+            ("put", "recipes/1",
+             dict(self.sample_recipes[0], name="Bread And Jam"), 200),
+            ("get", "recipes/1", None, 200),
+            ("get", "recipes/", None, 200),
+            ("get", "recipe_categories/1/recipes/", None, 200),
+            ("get", "recipes/cook_with?ingredients=bread", None, 200),
+            ("patch", "recipes/1?action=publish", None, 200),
+            ("delete", "recipes/1", None, 200),
+            ("post", "recipe_categories/", self.sample_categories[2], 201),
+            ("delete", "recipe_categories/3", None, 200),
+        ]
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            for method, url, data, status in calls:
+                response = call(method, base + url, data)
+                self.assertEqual(response.status_code, status,
+                                 f"{method} {url}")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return statements
+
+    @staticmethod
+    def add_filler_rows():
+        """ Gives the first user many categories and recipes and refreshes the planner statistics
+        so that the planner prefers the index matching the most columns of a query
+        """
+        db.session.execute(
+            "INSERT INTO recipe_categories (name, owner, created, edited) "
+            "SELECT 'Category ' || number, 1, now(), now() "
+            "FROM generate_series(1, 200) AS number")
+        db.session.execute(
+            "INSERT INTO recipes "
+            "(name, steps, ingredients, category_id, owner, created, edited) "
+            "SELECT 'Recipe ' || number, 'Cook', 'Salt', 1, 1, now(), now() "
+            "FROM generate_series(1, 2000) AS number")
+        db.session.execute("ANALYZE recipe_categories, recipes")
+        db.session.commit()
+
+    def test_queries_use_indexes(self):
+        """ Test that the rows read by every query made by the end points are found by an index """
+        statements = self.run_end_points()
+        self.assertTrue(statements)
+        IndexTestCases.add_filler_rows()
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            # sequential scans are priced out so that a query is only planned with one
+            # if no index can serve it
+            cursor.execute("SET enable_seqscan = off")
+            for statement, parameters in statements:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + statement,
+                               parameters)
+                plan = cursor.fetchone()[0][0]["Plan"]
+                self.assertEqual(unindexed_reads(plan), [], statement)
+        finally:
+            connection.rollback()
+            connection.close()
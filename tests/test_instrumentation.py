@@ -0,0 +1,46 @@
+""" This module has tests for recording the sql statements run by each request
+"""
+from api import app
+from api.instrumentation import RepeatedQueryError
+from api.models import User
+from tests import ApiBasicsTestCase
+
+
+class InstrumentationTestCases(ApiBasicsTestCase):
+    """ Tests the statement counts and the repeated statement check """
+
+    def test_query_headers(self):
+        """ Test that the statement count and time are sent when enabled """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        response = self.test_client().get("/yummy/api/v1.0/recipe_categories/",
+                                          headers=headers)
+        self.assertNotIn("X-Query-Count", response.headers)
+
+        self.app.config["YUMMY_SQL_HEADERS"] = True
+        with self.record_queries() as statements:
+            response = self.test_client().get(
+                "/yummy/api/v1.0/recipe_categories/", headers=headers)
+        self.assertEqual(response.headers["X-Query-Count"],
+                         str(len(statements)))
+        self.assertRegex(response.headers["Server-Timing"],
+                         r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+    def test_repeated_statement_strict(self):
+        """ Test that a request running a statement once per item fails in strict mode """
+        self.register_and_login_user()
+        threshold = self.app.config["YUMMY_REPEATED_QUERY_THRESHOLD"]
+        with app.test_request_context("/yummy/api/v1.0/recipes/"):
+            app.preprocess_request()
+            for _ in range(threshold - 1):
+                User.query.filter_by(id=1).first()
+            app.process_response(app.response_class())
+
+        with app.test_request_context("/yummy/api/v1.0/recipes/"):
+            app.preprocess_request()
+            for _ in range(threshold):
+                User.query.filter_by(id=1).first()
+            with self.assertLogs(app.logger, "WARNING"):
+                with self.assertRaises(RepeatedQueryError):
+                    app.process_response(app.response_class())
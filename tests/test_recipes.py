@@ -3,6 +3,8 @@ It has tests for testing functionality of recipes in the api
 """
 import json
 
+from api.cache import search_cache
+from api.routes import duplicate_recipe_error
 from tests import ApiBasicsTestCase
 
 
@@ -74,6 +76,129 @@ class RecipeTestCases(ApiBasicsTestCase):
             "A recipe with the same name, by the same user already exists in the same category",
             response_two.data.decode())
 
+    def test_duplicate_recipe_gone(self):
+        """ tests that a duplicate is reported without the recipe it clashed with once that is gone """
+        with self.app.test_request_context():
+            response, status = duplicate_recipe_error(1, 1, "Gone")
+        self.assertEqual(status, 400)
+        data = json.loads(response.data.decode())
+        self.assertIn("already exists in the same category", data["errors"][0])
+        self.assertNotIn("existing_recipe", data)
+
+    def test_duplicate_recipe_single_statement(self):
+        """ tests that a duplicate recipe is refused by the insert alone and the recipe it clashes with is returned """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        with self.record_queries() as statements:
+            response = self.create_recipe(self.sample_recipes[0], login_token)
+        recipe_statements = [
+            statement.split()[0] for statement in statements
+            if "recipes" in statement.split("WHERE")[0]
+        ]
+        # the insert, then the recipe it clashed with is fetched for the response
+        self.assertEqual(recipe_statements, ["INSERT", "SELECT"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.data.decode())["existing_recipe"]["id"], 1)
+
+        # a recipe keeps its name when edited
+        self.kwargs["data"] = json.dumps(
+            dict(self.sample_recipes[0], steps="1.Peel 2.Boil 3.Mash"))
+        edit_response = self.test_client().put("/yummy/api/v1.0/recipes/1",
+                                               **self.kwargs)
+        self.assertEqual(edit_response.status_code, 200)
+
+    def test_add_recipes_batch(self):
+        """ tests that many recipes are added with one insert and each gets its own result """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        recipes = [
+            self.sample_recipes[1], self.sample_recipes[0],
+            dict(self.sample_recipes[1], steps="another way to make it"),
+            dict(self.sample_recipes[1], name="p"),
+            {"name": "No Steps"},
+            dict(self.sample_recipes[1], name="Lost Recipe", category="9"),
+            dict(self.sample_recipes[1], name="Matooke Mash",
+                 ingredients="Matooke and Salt")
+        ]
+        self.kwargs["data"] = json.dumps({"recipes": recipes})
+        with self.record_queries() as statements:
+            response = self.test_client().post(
+                "/yummy/api/v1.0/recipes/batch", **self.kwargs)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data.decode())["results"]
+        self.assertEqual([result["status"] for result in results], [
+            "created", "duplicate", "duplicate", "invalid", "invalid",
+            "invalid", "created"
+        ])
+        self.assertEqual(results[6]["recipe"]["name"], "Matooke Mash")
+        self.assertIn("Name must be a minimum of 3 characters",
+                      results[3]["errors"])
+        self.assertIn("does not exist", results[5]["errors"][0])
+        self.assertEqual(
+            [statement.split()[2] for statement in statements
+             if statement.startswith("INSERT")],
+            ["recipes", "recipe_ingredients"])
+
+        # the ingredient index has the words of the added recipes
+        response = self.test_client().get(
+            "/yummy/api/v1.0/recipes/cook_with?ingredients=salt",
+            **self.kwargs)
+        self.assertEqual(
+            [recipe["name"]
+             for recipe in json.loads(response.data.decode())["recipes"]],
+            ["Matooke Mash"])
+
+        self.app.config["YUMMY_MAX_BATCH_SIZE"] = 2
+        response = self.test_client().post("/yummy/api/v1.0/recipes/batch",
+                                           **self.kwargs)
+        self.assertEqual(response.status_code, 400)
+
+    def test_move_and_delete_recipes_batch(self):
+        """ tests that recipes are moved and deleted in bulk with one statement each """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        for category in self.sample_categories[:2]:
+            self.create_recipe_category(category, login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        self.create_recipe(self.sample_recipes[1], login_token)
+        self.create_recipe(dict(self.sample_recipes[0], category="2"),
+                           login_token)
+
+        # the recipe named like one in category 2 stays behind
+        self.kwargs["data"] = json.dumps({"recipes": [1, 2, 9], "category": 2})
+        with self.record_queries() as statements:
+            response = self.test_client().put(
+                "/yummy/api/v1.0/recipes/batch", **self.kwargs)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["moved"], [2])
+        self.assertEqual(data["conflicts"], [{"id": 1, "name": "Banana Crumbs"}])
+        self.assertEqual(data["not_found"], [9])
+        self.assertEqual(
+            len([statement for statement in statements
+                 if statement.startswith("UPDATE recipes")]), 1)
+
+        self.kwargs["data"] = json.dumps({"recipes": [1, 2, 9]})
+        with self.record_queries() as statements:
+            response = self.test_client().delete(
+                "/yummy/api/v1.0/recipes/batch", **self.kwargs)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data["deleted"], [1, 2])
+        self.assertEqual(data["not_found"], [9])
+        self.assertEqual(
+            [statement.split()[0] for statement in statements
+             if not statement.startswith("SELECT")], ["DELETE"])
+
+        self.kwargs["data"] = json.dumps({"recipes": "1,2"})
+        response = self.test_client().delete("/yummy/api/v1.0/recipes/batch",
+                                             **self.kwargs)
+        self.assertEqual(response.status_code, 400)
+
     def test_invalid_data(self):
         """ tests recipe addition fails if invalid data is supplied """
         # register and login user
@@ -350,3 +475,113 @@ class RecipeTestCases(ApiBasicsTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Recipe exists", response.data.decode())
         self.assertIn(self.sample_recipes[0]["steps"], response.data.decode())
+
+    def test_listing_query_count(self):
+        """ tests that listing recipes costs the same number of queries however many recipes exist """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        urls = [
+            "/yummy/api/v1.0/recipes/",
+            "/yummy/api/v1.0/recipe_categories/",
+            "/yummy/api/v1.0/recipe_categories/1/recipes/",
+            "/yummy/api/v1.0/search?q=a"
+        ]
+
+        def count_queries():
+            """ Returns the number of queries each listing makes """
+            counts = []
+            for url in urls:
+                search_cache.clear()
+                with self.record_queries() as statements:
+                    response = self.test_client().get(url, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                counts.append(len(statements))
+            return counts
+
+        counts = count_queries()
+        # add more categories with recipes in each
+        for category_id, category in enumerate(self.sample_categories[1:], 2):
+            self.create_recipe_category(category, login_token)
+            for recipe in self.sample_recipes:
+                self.create_recipe(
+                    dict(recipe, category=str(category_id)), login_token)
+        self.create_recipe(self.sample_recipes[1], login_token)
+
+        self.assertEqual(count_queries(), counts)
+
+    def test_recipes_pagination(self):
+        """ tests that recipes can be fetched a page at a time using cursors """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, login_token)
+
+        names = []
+        url = "/yummy/api/v1.0/recipes/?limit=1"
+        while url:
+            response = self.test_client().get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data.decode())
+            self.assertTrue(len(data["recipes"]) <= 1)
+            names += [recipe["name"] for recipe in data["recipes"]]
+            url = data["next_cursor"] and \
+                f"/yummy/api/v1.0/recipes/?limit=1&after={data['next_cursor']}"
+        self.assertEqual(names, ["Banana Crumbs", "Bread N Butter"])
+
+    def test_invalid_pagination_params(self):
+        """ tests that listing recipes fails with an invalid cursor or limit """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        for query in ["after=invalidcursor", "limit=0", "limit=ten"]:
+            response = self.test_client().get(
+                f"/yummy/api/v1.0/recipes/?{query}", headers=headers)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Request not Understood", response.data.decode())
+
+    def test_cook_with_ingredients(self):
+        """ tests that recipes are ranked by the share of their ingredients available """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, login_token)
+        self.create_recipe({
+            "name": "Matooke Stew",
+            "steps": "1.Peel 2.Stew",
+            "ingredients": "Matooke, Onions, Tomatoes and Beef",
+            "category": "1"
+        }, login_token)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/recipes/cook_with?ingredients=tomato,matooke,onion",
+            headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data["ingredients"], ["matooke", "onion", "tomato"])
+        self.assertEqual(
+            [(recipe["name"], recipe["matched_ingredients"], recipe["coverage"])
+             for recipe in data["recipes"]],
+            [("Banana Crumbs", 2, 1.0), ("Matooke Stew", 3, 0.75)])
+
+        # the index follows edits to a recipe
+        self.kwargs["data"] = json.dumps(
+            dict(self.sample_recipes[1], name="Tomato Sandwich",
+                 ingredients="Bread, Tomatoes"))
+        self.test_client().put("/yummy/api/v1.0/recipes/2", **self.kwargs)
+        response = self.test_client().get(
+            "/yummy/api/v1.0/recipes/cook_with?ingredients=tomatoes+bread",
+            headers=headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(data["recipes"][0]["name"], "Tomato Sandwich")
+        self.assertEqual(data["recipes"][0]["coverage"], 1.0)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/recipes/cook_with?ingredients=", headers=headers)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,133 @@
+""" This module has tests for sending the reads of GET requests to read replicas
+The test database stands in for a replica so that the replica has the same data
+"""
+import json
+
+from sqlalchemy import event, exc
+
+from api import db
+from api.database import pool_stats
+from api.replicas import router, recent_writers
+from tests import ApiBasicsTestCase
+
+UNREACHABLE_URI = "postgresql://postgres@127.0.0.1:1/yummy_replica"
+
+
+class ReplicaTestCases(ApiBasicsTestCase):
+    """ Tests which database serves each request """
+
+    def setUp(self):
+        super().setUp()
+        self.replica_uri = self.app.config["SQLALCHEMY_DATABASE_URI"]
+        self.app.config["YUMMY_REPLICA_URIS"] = [self.replica_uri]
+        # every request must read the database to see where its reads go
+        self.app.config["YUMMY_RESPONSE_CACHE"] = False
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        recent_writers.clear()
+
+    def tearDown(self):
+        recent_writers.clear()
+        super().tearDown()
+        router.dispose()
+
+    def count_statements(self, method, url):
+        """ Calls an end point and counts the statements run on the primary and on the replica """
+        counts = {"primary": 0, "replica": 0}
+
+        def on(name):
+            """ Returns a listener counting statements under name """
+
+            def count(conn, cursor, statement, parameters, context,
+                      executemany):
+                counts[name] += 1
+
+            return count
+
+        listeners = [(db.engine, on("primary")),
+                     (router.engine_for(self.replica_uri), on("replica"))]
+        for engine, listener in listeners:
+            event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = getattr(self.test_client(), method)(
+                url, headers={"x-access-token": self.login_token})
+        finally:
+            for engine, listener in listeners:
+                event.remove(engine, "before_cursor_execute", listener)
+        self.assertLess(response.status_code, 500)
+        return counts
+
+    def test_reads_go_to_replica(self):
+        """ Test that GET requests read from the replica and writes from the primary """
+        # the listing runs its version query and its select
+        self.assertEqual(
+            self.count_statements("get", "/yummy/api/v1.0/recipe_categories/"),
+            {"primary": 0, "replica": 2})
+        counts = self.count_statements("delete",
+                                       "/yummy/api/v1.0/recipe_categories/1")
+        self.assertEqual(counts["replica"], 0)
+        self.assertGreater(counts["primary"], 0)
+
+    def test_read_your_writes(self):
+        """ Test that a user who has just written reads from the primary """
+        self.kwargs["data"] = json.dumps(self.sample_categories[1])
+        self.test_client().post("/yummy/api/v1.0/recipe_categories/",
+                                **self.kwargs)
+        self.assertEqual(
+            self.count_statements("get", "/yummy/api/v1.0/recipe_categories/"),
+            {"primary": 2, "replica": 0})
+        # once the window is over the replica is used again
+        recent_writers.clear()
+        self.assertEqual(
+            self.count_statements("get", "/yummy/api/v1.0/recipe_categories/"),
+            {"primary": 0, "replica": 2})
+
+    def test_unreachable_replica_skipped(self):
+        """ Test that an unreachable replica is skipped and the primary used if none is left """
+        self.app.config["YUMMY_REPLICA_URIS"] = [
+            UNREACHABLE_URI, self.replica_uri
+        ]
+        for _ in range(2):
+            self.assertEqual(
+                self.count_statements("get",
+                                      "/yummy/api/v1.0/recipe_categories/"),
+                {"primary": 0, "replica": 2})
+        self.assertEqual(router.down, [UNREACHABLE_URI])
+        # the pools are listed without the passwords of the uris
+        self.assertIn(repr(router.engine_for(self.replica_uri).url),
+                      router.pool_stats)
+        self.assertNotIn("mypassword", json.dumps(router.pool_stats))
+
+        self.app.config["YUMMY_REPLICA_URIS"] = [UNREACHABLE_URI]
+        self.assertEqual(
+            self.count_statements("get", "/yummy/api/v1.0/recipe_categories/"),
+            {"primary": 2, "replica": 0})
+
+    def test_replica_checked_once_per_interval(self):
+        """ Test that a replica that answered is not connected to again on every request """
+        url = "/yummy/api/v1.0/recipe_categories/"
+        engine = router.engine_for(self.replica_uri)
+        # the session of the tests keeps its connection, so the checkouts left are the checks
+        self.app.config["YUMMY_REPLICA_CHECK_INTERVAL"] = 0
+        self.count_statements("get", url)
+        checkouts = pool_stats(engine)["checkouts"]
+        self.count_statements("get", url)
+        self.assertEqual(pool_stats(engine)["checkouts"], checkouts + 1)
+
+        self.app.config["YUMMY_REPLICA_CHECK_INTERVAL"] = 60
+        for _ in range(3):
+            self.count_statements("get", url)
+        self.assertEqual(pool_stats(engine)["checkouts"], checkouts + 2)
+
+    def test_lost_replica_skipped(self):
+        """ Test that a replica whose connection is lost is skipped without waiting for a check """
+        self.count_statements("get", "/yummy/api/v1.0/recipe_categories/")
+        with router.engine_for(self.replica_uri).connect() as connection:
+            with self.assertRaises(exc.DBAPIError):
+                connection.execute("SELECT pg_terminate_backend(pg_backend_pid())")
+        self.assertEqual(router.down, [self.replica_uri])
+        self.assertEqual(
+            self.count_statements("get", "/yummy/api/v1.0/recipe_categories/"),
+            {"primary": 2, "replica": 0})
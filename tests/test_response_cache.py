@@ -0,0 +1,139 @@
+""" This module has tests for caching the responses of GET end points
+"""
+import json
+
+from api import db
+from api.cache import response_cache_routes
+from tests import ApiBasicsTestCase
+
+
+class ResponseCacheTestCases(ApiBasicsTestCase):
+    """ Tests serving cached responses and dropping them when their data changes """
+
+    def setUp(self):
+        super().setUp()
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, self.login_token)
+
+    def request(self, method, url, data=None):
+        """ Calls an end point as the logged in user """
+        kwargs = {"headers": {"x-access-token": self.login_token}}
+        if data is not None:
+            kwargs.update(
+                data=json.dumps(data), content_type="application/json")
+        return getattr(self.test_client(), method)("/yummy/api/v1.0/" + url,
+                                                   **kwargs)
+
+    def is_cached(self, url):
+        """ Gets an end point and tells whether the response came from the cache """
+        with self.record_queries() as statements:
+            response = self.request("get", url)
+        self.assertEqual(response.status_code, 200)
+        # a cached response only costs the version query of its etag
+        return not any(statement.lstrip().startswith("SELECT recipes.id")
+                       or statement.lstrip().startswith(
+                           "SELECT recipe_categories.id")
+                       or statement.lstrip().startswith("SELECT users.")
+                       for statement in statements)
+
+    def test_repeated_get_cached(self):
+        """ Test that a repeated GET is served from the cache and counted """
+        first = self.request("get", "recipes/")
+        self.assertTrue(self.is_cached("recipes/"))
+        self.assertEqual(self.request("get", "recipes/").data, first.data)
+        self.assertEqual(response_cache_routes.stats["get_all_user_recipes"], {
+            "hits": 2,
+            "misses": 1,
+            "hit_ratio": 2 / 3
+        })
+
+    def test_writes_drop_tagged_responses(self):
+        """ Test that a write drops only the responses showing the data it changed """
+        urls = [
+            "recipes/", "recipes/1", "recipes/2", "recipe_categories/",
+            "recipe_categories/1", "recipe_categories/1/recipes/"
+        ]
+        for url in urls:
+            self.request("get", url)
+
+        self.request("put", "recipes/1",
+                     dict(self.sample_recipes[0], name="Jam"))
+        self.assertEqual(
+            {url: self.is_cached(url) for url in urls}, {
+                "recipes/": False,
+                "recipes/1": False,
+                "recipes/2": True,
+                "recipe_categories/": True,
+                "recipe_categories/1": True,
+                "recipe_categories/1/recipes/": False
+            })
+
+        # the recipes show the details of their category
+        self.request("put", "recipe_categories/1", self.sample_categories[1])
+        response = self.request("get", "recipes/2")
+        self.assertIn("Lunch And Supper", response.data.decode())
+
+    def test_missing_recipe_not_kept(self):
+        """ Test that adding a recipe drops the cached answer that it does not exist """
+        self.assertIn("does not exist",
+                      self.request("get", "recipes/3").data.decode())
+        self.create_recipe(
+            dict(self.sample_recipes[0], name="Jam"), self.login_token)
+        self.assertIn("Jam", self.request("get", "recipes/3").data.decode())
+
+    def test_user_details_change(self):
+        """ Test that editing user details drops the responses showing them """
+        self.request("get", "users/1/")
+        self.request("get", "recipes/")
+        self.request("put", "users/", {
+            "firstname": "Pat",
+            "lastname": "Dennis",
+            "email": self.user_details1["email"]
+        })
+        self.assertIn("Pat", self.request("get", "users/1/").data.decode())
+        self.assertIn("Pat", self.request("get", "recipes/").data.decode())
+
+    def test_route_ttl(self):
+        """ Test that an end point given no time to live is not served from the cache """
+        self.app.config["YUMMY_RESPONSE_CACHE_TTLS"] = {"get_recipe": 0}
+        self.request("get", "recipes/1")
+        self.assertFalse(self.is_cached("recipes/1"))
+        self.request("get", "recipes/")
+        self.assertTrue(self.is_cached("recipes/"))
+
+    def test_cache_stats(self):
+        """ Test that administrators can see the hit ratios of the caches and pools """
+        self.request("get", "recipes/")
+        self.request("get", "recipes/")
+        self.assertEqual(
+            self.request("get", "admin/cache_stats").status_code, 403)
+        self.app.config["YUMMY_ADMIN_EMAILS"] = [self.user_details1["email"]]
+        stats = json.loads(self.request("get", "admin/cache_stats").data)
+        self.assertEqual(stats["response_cache"]["hits"], 1)
+        self.assertEqual(
+            stats["response_cache_routes"]["get_all_user_recipes"]["hit_ratio"],
+            0.5)
+        self.assertIn("pending", stats["password_hasher"])
+        self.assertIn("checkouts", stats["database_pools"]["primary"])
+
+    def test_cached_body_matches_etag(self):
+        """ Test that a body cached for older data is not sent with the etag of newer data
+        as when another worker handled the write
+        """
+        self.request("get", "recipes/")
+        db.session.execute("UPDATE recipes SET name = 'Changed', edited = now() "
+                           "WHERE id = 1")
+        db.session.commit()
+        response = self.request("get", "recipes/")
+        self.assertIn("Changed", response.data.decode())
+        self.assertEqual(
+            self.test_client().get(
+                "/yummy/api/v1.0/recipes/",
+                headers={
+                    "x-access-token": self.login_token,
+                    "If-None-Match": response.headers["ETag"]
+                }).status_code, 304)
@@ -1,8 +1,22 @@
 """ This module has tests to test for search functionality of the api
 """
+import json
+import unittest
+
+from sqlalchemy import text
+
+from api import db
+from api.cache import search_cache
 from tests import ApiBasicsTestCase
 
 
+def trigram_available():
+    """ Checks whether the pg_trgm extension can be used by the test database """
+    return db.session.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar() is not None
+
+
 class SearchTestCases(ApiBasicsTestCase):
     """ The class has methods to test for api search functionality """
     def test_search(self):
@@ -102,3 +116,198 @@ class SearchTestCases(ApiBasicsTestCase):
         self.assertIn(
             "Check that you have supplied all the required data and try again",
             response.data.decode())
+
+    def test_fulltext_search(self):
+        """ Test if the full text search backend finds and ranks matching items """
+        self.app.config["YUMMY_SEARCH_BACKEND"] = "fulltext"
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        for category in self.sample_categories:
+            self.create_recipe_category(category, login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        self.create_recipe({
+            "name": "Tomato Soup",
+            "steps": "1.Boil 2.Serve",
+            "ingredients": "Water, Salt",
+            "category": "1"
+        }, login_token)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=tomatoes+lunch+jjagwe",
+            headers={"x-access-token": login_token})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode())
+        # the recipe named tomato ranks above the one with tomatoes as an ingredient
+        self.assertEqual([recipe["name"] for recipe in data["recipes"]],
+                         ["Tomato Soup", "Banana Crumbs"])
+        self.assertEqual([cat["name"] for cat in data["categories"]],
+                         ["Lunch And Supper"])
+        self.assertEqual(data["users_count"], 1)
+
+    def test_trigram_search_needs_extension(self):
+        """ Test that the trigram backend refuses to run without pg_trgm """
+        if db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).scalar() is not None:
+            raise unittest.SkipTest("The pg_trgm extension is installed")
+        self.app.config["YUMMY_SEARCH_BACKEND"] = "trigram"
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        with self.assertRaisesRegex(RuntimeError, "pg_trgm"):
+            self.test_client().get(
+                "/yummy/api/v1.0/search?q=bread",
+                headers={"x-access-token": login_token})
+
+    def test_trigram_search(self):
+        """ Test if the trigram search backend finds partial and misspelt words """
+        if not trigram_available():
+            raise unittest.SkipTest("The pg_trgm extension is not available")
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.commit()
+        self.app.config["YUMMY_SEARCH_BACKEND"] = "trigram"
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category({"cat_name": "Chicken Dishes"}, login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=chick+tomatoe",
+            headers={"x-access-token": login_token})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode())
+        self.assertEqual([recipe["name"] for recipe in data["recipes"]],
+                         ["Banana Crumbs"])
+        self.assertEqual([cat["name"] for cat in data["categories"]],
+                         ["Chicken Dishes"])
+
+    def test_invalid_page_params(self):
+        """ Test that pages and page sizes other than whole numbers from 1 are refused """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        for params in ["per_page=0", "per_page=-1", "per_page=abc", "page=0",
+                       "page=-2", "page=abc"]:
+            response = self.test_client().get(
+                f"/yummy/api/v1.0/search?q=b&{params}", headers=headers)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_count_modes(self):
+        """ Test if search can skip or estimate counting of results """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        for recipe in self.sample_recipes:
+            self.create_recipe(recipe, login_token)
+        headers = {"x-access-token": login_token}
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=b&per_page=1&count=none",
+            headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode())
+        self.assertEqual(len(data["recipes"]), 1)
+        self.assertIsNone(data["recipes_count"])
+        self.assertIsNone(data["total_pages"])
+        self.assertEqual(data["next_page"], 2)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=b&count=estimate", headers=headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data["recipes_count"] >= 2)
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=b&count=all", headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("The count option can either be exact, estimate or none",
+                      response.data.decode())
+
+    def test_sequential_search(self):
+        """ Test if search works when the lookups run one after the other """
+        self.app.config["YUMMY_SEARCH_WORKERS"] = 0
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search?q=Banana",
+            headers={"x-access-token": login_token})
+        data = json.loads(response.data.decode())
+        self.assertEqual(data["recipes_count"], 1)
+        self.assertEqual(data["total_pages"], 1)
+        self.assertNotIn("next_page", data)
+
+    def test_search_cache(self):
+        """ Test if search results are cached and dropped when the user's recipes change """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+
+        def search_recipes(query):
+            """ Returns the cache status and names of recipes found """
+            response = self.test_client().get(
+                f"/yummy/api/v1.0/search?q={query}", headers=headers)
+            data = json.loads(response.data.decode())
+            return response.headers["X-Cache"], [
+                recipe["name"] for recipe in data["recipes"]
+            ]
+
+        self.assertEqual(search_recipes("Bread+Banana"),
+                         ("MISS", ["Banana Crumbs"]))
+        # the same terms in another order hit the cache
+        self.assertEqual(search_recipes("Banana+Bread+Banana"),
+                         ("HIT", ["Banana Crumbs"]))
+        self.create_recipe(self.sample_recipes[1], login_token)
+        # the users results are still cached but the recipes are looked up again
+        self.assertEqual(
+            search_recipes("Bread+Banana"),
+            ("PARTIAL", ["Banana Crumbs", "Bread N Butter"]))
+        self.assertEqual(search_cache.stats["hits"], 4)
+
+    def test_search_cache_off(self):
+        """ Test that results are neither cached nor read from the cache when it is off """
+        self.app.config["YUMMY_SEARCH_CACHE"] = False
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        for _ in range(2):
+            response = self.test_client().get(
+                "/yummy/api/v1.0/search?q=Banana",
+                headers={"x-access-token": login_token})
+            self.assertEqual(response.headers["X-Cache"], "MISS")
+        self.assertEqual(len(search_cache), 0)
+
+    def test_suggest(self):
+        """ Test if names with a word starting with the prefix are suggested as the user adds and renames recipes """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.create_recipe_category(self.sample_categories[0], login_token)
+        self.create_recipe(self.sample_recipes[0], login_token)
+
+        def suggest(prefix):
+            """ Returns the names and types suggested for a prefix """
+            response = self.test_client().get(
+                f"/yummy/api/v1.0/search/suggest?prefix={prefix}",
+                headers=headers)
+            self.assertEqual(response.status_code, 200)
+            return [(suggestion["name"], suggestion["type"]) for suggestion in
+                    json.loads(response.data.decode())["suggestions"]]
+
+        # any word of a name can match, regardless of case
+        self.assertEqual(suggest("crum"), [("Banana Crumbs", "recipe")])
+        self.assertEqual(suggest("B"), [("Banana Crumbs", "recipe"),
+                                        ("Break Fast", "category")])
+        # the built index is updated in place as the user makes changes
+        self.create_recipe(self.sample_recipes[1], login_token)
+        self.assertIn(("Bread N Butter", "recipe"), suggest("butt"))
+        self.kwargs["data"] = json.dumps({"cat_name": "Supper"})
+        self.test_client().put("/yummy/api/v1.0/recipe_categories/1",
+                               **self.kwargs)
+        self.assertEqual(suggest("fast"), [])
+        self.assertEqual(suggest("sup"), [("Supper", "category")])
+
+        response = self.test_client().get(
+            "/yummy/api/v1.0/search/suggest?prefix=", headers=headers)
+        self.assertEqual(response.status_code, 400)
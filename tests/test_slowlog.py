@@ -0,0 +1,80 @@
+""" This module has tests for the slow query log and its admin end points
+"""
+import json
+import os
+import tempfile
+
+from api import db
+from api.slowlog import slow_queries
+from tests import ApiBasicsTestCase
+
+SLOW_SELECT = ("SELECT pg_sleep(0.01), "
+               "(SELECT relname FROM pg_class WHERE relname = :name)")
+
+
+class SlowQueryLogTestCases(ApiBasicsTestCase):
+    """ Tests keeping slow statements with their plans """
+
+    def setUp(self):
+        super().setUp()
+        self.app.config["YUMMY_SLOW_QUERY_MS"] = 5
+
+    def test_slow_select_kept_with_plan(self):
+        """ Test that a slow select is kept with its plan and redacted parameters """
+        db.session.execute(SLOW_SELECT, {"name": "secret"})
+        entry = slow_queries.entries()["slowest"][0]
+        self.assertIn("pg_sleep", entry["statement"])
+        self.assertEqual(entry["parameters"], {"name": "str"})
+        self.assertGreaterEqual(entry["duration_ms"], 5)
+        self.assertIn("Shared Hit Blocks", entry["plan"][0]["Plan"])
+        # the parameters are neither in the entry nor in the conditions of the plan
+        self.assertNotIn("secret", json.dumps(slow_queries.entries()))
+        self.assertIn("relname = '?'", json.dumps(entry["plan"]))
+
+        # the transaction of the statement can still be used
+        self.assertEqual(db.session.execute("SELECT 1").scalar(), 1)
+
+    def test_slowest_plans_bounded(self):
+        """ Test that only the slowest statements keep their plans """
+        self.app.config["YUMMY_SLOW_QUERY_MS"] = 1
+        slow_queries.plans = 1
+        try:
+            db.session.execute("SELECT pg_sleep(0.02)")
+            db.session.execute("SELECT pg_sleep(0.005)")
+            entries = slow_queries.entries()
+        finally:
+            slow_queries.plans = self.app.config["YUMMY_SLOW_QUERY_PLANS"]
+        self.assertEqual(len(entries["recent"]), 2)
+        self.assertIsNone(entries["recent"][0]["plan"])
+        self.assertEqual(len(entries["slowest"]), 1)
+        self.assertIn("0.02", entries["slowest"][0]["statement"])
+
+    def test_admin_end_points(self):
+        """ Test that only administrators can view, dump and clear the log """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        url = "/yummy/api/v1.0/admin/slow_queries"
+        response = self.test_client().get(url, headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.app.config["YUMMY_ADMIN_EMAILS"] = [self.user_details1["email"]]
+        slow_queries.clear()
+        db.session.execute(SLOW_SELECT, {"name": "secret"})
+        response = self.test_client().get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)["slowest"]), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "slow_queries.json")
+            self.app.config["YUMMY_SLOW_QUERY_DUMP"] = path
+            response = self.test_client().post(url + "/dump", headers=headers)
+            self.assertEqual(response.status_code, 200)
+            with open(path) as dump_file:
+                self.assertEqual(
+                    json.load(dump_file)["slowest"][0]["parameters"],
+                    {"name": "str"})
+
+        response = self.test_client().delete(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(slow_queries.entries(), {"recent": [], "slowest": []})
@@ -0,0 +1,90 @@
+""" This module has tests for streaming all the items of a listing
+"""
+import json
+
+from sqlalchemy import event
+
+from api import db
+from tests import ApiBasicsTestCase
+
+
+class StreamingTestCases(ApiBasicsTestCase):
+    """ Tests the listings asked for with stream=true """
+
+    def setUp(self):
+        super().setUp()
+        self.login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.create_recipe_category(self.sample_categories[0],
+                                    self.login_token)
+        self.test_client().post(
+            "/yummy/api/v1.0/recipes/batch",
+            data=json.dumps({
+                "recipes": [
+                    dict(self.sample_recipes[0], name=f"Recipe {number}")
+                    for number in range(25)
+                ]
+            }),
+            content_type="application/json",
+            headers={"x-access-token": self.login_token})
+        self.app.config["YUMMY_STREAM_BATCH_SIZE"] = 10
+
+    def get(self, url):
+        """ Gets an end point as the logged in user """
+        return self.test_client().get(
+            "/yummy/api/v1.0/" + url,
+            headers={"x-access-token": self.login_token})
+
+    def test_recipes_streamed(self):
+        """ Test that all recipes are streamed from a server side cursor in the order of the pages """
+        cursor_names = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("SELECT recipes.id"):
+                cursor_names.append(cursor.name)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            response = self.get("recipes/?stream=true")
+            self.assertTrue(response.is_streamed)
+            streamed = json.loads(response.data)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual(len(cursor_names), 1)
+        self.assertIsNotNone(cursor_names[0])
+
+        paged, next_cursor = [], None
+        while True:
+            page = json.loads(
+                self.get("recipes/?limit=20" + (
+                    f"&after={next_cursor}" if next_cursor else "")).data)
+            paged.extend(page["recipes"])
+            next_cursor = page["next_cursor"]
+            if not next_cursor:
+                break
+        self.assertEqual(streamed, {"recipes": paged, "next_cursor": None})
+        self.assertEqual(len(paged), 25)
+
+        # streamed responses are not cached or compressed
+        response = self.test_client().get(
+            "/yummy/api/v1.0/recipes/?stream=true",
+            headers={
+                "x-access-token": self.login_token,
+                "Accept-Encoding": "gzip"
+            })
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(json.loads(response.data), streamed)
+
+    def test_other_listings_streamed(self):
+        """ Test that the category and user listings are streamed with their other keys """
+        categories = json.loads(self.get("recipe_categories/?stream=true").data)
+        self.assertEqual(categories["message"], "Recipe Categories exists")
+        self.assertEqual(len(categories["recipe_cats"]), 1)
+
+        in_category = json.loads(
+            self.get("recipe_categories/1/recipes/?stream=true").data)
+        self.assertEqual(len(in_category["recipes"]), 25)
+
+        users = json.loads(self.get("users/?stream=true").data)
+        self.assertEqual([user["email"] for user in users["users"]],
+                         [self.user_details1["email"]])
@@ -2,7 +2,11 @@
  login, editing user details, changing password e.t.c"""
 import json
 from base64 import b64encode
+from unittest import mock
 
+from api import db, trust_proxies
+from api.cache import token_cache
+from api.hashing import password_hasher, HashingBusyError
 from tests import ApiBasicsTestCase
 
 
@@ -73,6 +77,14 @@ class UserTestCases(ApiBasicsTestCase):
             f"Email address \'{self.user_details1['email']}\' already in use",
             response_string)
 
+    def test_user_exists_other_case(self):
+        """ test whether a user cant register with a used email written in another case """
+        self.register_user(self.user_details1)
+        response = self.register_user(
+            dict(self.user_details1, email="DennisJjagwe@Gmail.com"))
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("already in use", response.data.decode())
+
     def test_missing_login(self):
         """ test whether a user cant login if some data is missing """
         # try logging in with no login data sent
@@ -313,3 +325,132 @@ class UserTestCases(ApiBasicsTestCase):
             })
         self.assertEqual(response.status_code, 400)
         self.assertIn("Request not Understood", response.data.decode())
+
+    def test_token_is_cached(self):
+        """ tests whether a verified token is reused on subsequent requests """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        for _ in range(2):
+            response = self.test_client().get(
+                "/yummy/api/v1.0/users/", headers={
+                    "x-access-token": login_token
+                })
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_cache.stats["misses"], 1)
+        self.assertEqual(token_cache.stats["hits"], 1)
+
+    def test_cached_user_reads_password(self):
+        """ tests whether a cached user is checked against the password changed by another worker """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        self.test_client().get("/yummy/api/v1.0/users/", headers=headers)
+        self.assertNotIn("password", token_cache.get(login_token))
+        db.session.execute("UPDATE users SET password = :password",
+                           {"password": password_hasher.hash("otherpassword")})
+        db.session.commit()
+        self.kwargs["data"] = json.dumps({
+            "current_password": "otherpassword",
+            "new_password": "newpassword",
+            "new_password_again": "newpassword"
+        })
+        self.kwargs["headers"] = headers
+        response = self.test_client().patch("/yummy/api/v1.0/users/",
+                                            **self.kwargs)
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_checked_against_database(self):
+        """ tests whether a cached user whose email changed elsewhere loses admin access """
+        self.app.config["YUMMY_ADMIN_EMAILS"] = [self.user_details1["email"]]
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        headers = {"x-access-token": login_token}
+        response = self.test_client().get(
+            "/yummy/api/v1.0/admin/slow_queries", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        db.session.execute("UPDATE users SET email = 'other@gmail.com'")
+        db.session.commit()
+        response = self.test_client().get(
+            "/yummy/api/v1.0/admin/slow_queries", headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_cached_token_dropped_on_edit(self):
+        """ tests whether editing user details drops the cached tokens of the user """
+        login_token = self.get_token_from_response(
+            self.register_and_login_user())
+        self.kwargs["data"] = json.dumps({
+            "firstname": "Jonah",
+            "lastname": "Pat",
+            "email": self.user_details1["email"]
+        })
+        self.kwargs["headers"] = {"x-access-token": login_token}
+        response = self.test_client().put("/yummy/api/v1.0/users/",
+                                          **self.kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_cache), 0)
+
+        # the next request sees the new details
+        response = self.test_client().get(
+            "/yummy/api/v1.0/users/", headers={
+                "x-access-token": login_token
+            })
+        self.assertIn("Jonah", response.data.decode())
+
+    def test_hashing_pool_busy(self):
+        """ tests whether login fails with a 503 when the password hashing pool is full """
+        self.register_user(self.user_details1)
+        with mock.patch.object(
+                password_hasher, "verify",
+                side_effect=HashingBusyError("The server is busy. Please try again shortly")):
+            response = self.login_user(self.login_details1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers.get("Retry-After"), "1")
+        self.assertIn("The server is busy", response.data.decode())
+
+    def test_login_rate_limited(self):
+        """ tests whether repeated login attempts for one email are throttled """
+        login_details = {"username": "dennisjjagwe@gmail.com", "password": "x"}
+        responses = [self.login_user(login_details) for _ in range(11)]
+        self.assertEqual(responses[9].status_code, 401)
+        self.assertEqual(responses[10].status_code, 429)
+        self.assertIn("Too many attempts", responses[10].data.decode())
+        self.assertTrue(int(responses[10].headers.get("Retry-After")) > 0)
+
+        # other emails are not affected
+        login_details["username"] = "kingden@gmail.com"
+        self.assertEqual(self.login_user(login_details).status_code, 401)
+
+    def forwarded_logins(self, addresses):
+        """ Makes a failed login from each forwarded address with the per ip limit at 2 """
+        self.app.config["YUMMY_RATELIMIT_PER_IP"] = "2/60"
+        return [
+            self.login_user(
+                {"username": f"user{index}@gmail.com", "password": "x"},
+                headers={"X-Forwarded-For": address}).status_code
+            for index, address in enumerate(addresses)
+        ]
+
+    def test_login_rate_limited_per_forwarded_address(self):
+        """ tests whether clients behind a trusted proxy are throttled by their own address """
+        wsgi_app = self.app.wsgi_app
+        self.app.wsgi_app = trust_proxies(wsgi_app, 1)
+        try:
+            statuses = self.forwarded_logins(
+                ["203.0.113.1", "203.0.113.1", "203.0.113.1", "203.0.113.2"])
+        finally:
+            self.app.wsgi_app = wsgi_app
+        self.assertEqual(statuses, [401, 401, 429, 401])
+
+    def test_forwarded_address_untrusted_by_default(self):
+        """ tests whether a client cannot escape the limit by sending other forwarded addresses """
+        statuses = self.forwarded_logins(
+            ["203.0.113.1", "203.0.113.2", "203.0.113.3"])
+        self.assertEqual(statuses, [401, 401, 429])
+
+    def test_login_with_json_list(self):
+        """ tests whether a json body that is not an object is answered with a 400 """
+        response = self.test_client().post(
+            "/yummy/api/v1.0/auth/login/", data=json.dumps([1]),
+            content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Missing login credentials", response.data.decode())
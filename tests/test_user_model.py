@@ -2,6 +2,7 @@
 """
 import unittest
 
+from api.hashing import PasswordHasher, HashingBusyError
 from api.models import User
 
 
@@ -35,3 +36,16 @@ class UserModelTestCase(unittest.TestCase):
         user1 = User("dennisj@gmail.com", "jjagwe", "denni", "password")
         user2 = User("dennisj@gmail.com", "king", "dennis", "password")
         self.assertNotEqual(user1.password, user2.password)
+
+    def test_hasher_rejects_when_full(self):
+        """ tests whether the password hasher refuses jobs when all its slots are taken """
+        hasher = PasswordHasher(workers=0, max_pending=0, wait=0)
+        with self.assertRaises(HashingBusyError):
+            hasher.hash("mypassword")
+        self.assertEqual(hasher.stats["rejected"], 1)
+        self.assertEqual(hasher.stats["jobs"], 0)
+
+        hasher = PasswordHasher(workers=0, max_pending=1, wait=0)
+        self.assertTrue(hasher.verify(hasher.hash("mypassword"), "mypassword"))
+        self.assertEqual(hasher.stats["rejected"], 0)
+        self.assertEqual(hasher.stats["jobs"], 2)